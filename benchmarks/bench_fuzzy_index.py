@@ -0,0 +1,107 @@
+"""
+Benchmark fuzzy translation-memory index build and query time.
+
+Usage:
+    uv run python benchmarks/bench_fuzzy_index.py --entries 1000000
+    uv run python benchmarks/bench_fuzzy_index.py --entries 1000000 --corpus templated
+"""
+import argparse
+import gzip
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# The benchmark never talks to DeepL: run the server against an empty replay journal
+journal_path = os.path.join(tempfile.mkdtemp(), "empty_journal.jsonl.gz")
+gzip.open(journal_path, "wt").close()
+os.environ["DEEPL_JOURNAL_MODE"] = "replay"
+os.environ["DEEPL_JOURNAL_PATH"] = journal_path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+def make_vocabulary(rng: random.Random):
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 9))) for _ in range(5000)]
+
+
+def make_segments(count: int, seed: int = 0):
+    """Generate UI-string-like segments from a synthetic vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 12))) + f" {rng.randint(0, 999)}"
+        for _ in range(count)
+    ]
+
+
+def make_templated_segments(count: int, seed: int = 0, templates: int = 200):
+    """
+    Generate segments from a few templates that differ only in their numbers, like
+    "Page 3 of 12" or "You have 5 new messages", the duplicate-heavy case of real UI strings
+    """
+    rng = random.Random(seed)
+    # About one word in eleven is a number slot
+    words = make_vocabulary(rng) + ["{}"] * 500
+    patterns = [
+        " ".join(rng.choice(words) for _ in range(rng.randint(3, 10))) + " {}"
+        for _ in range(templates)
+    ]
+    return [
+        rng.choice(patterns).format(*(rng.randint(0, 99_999) for _ in range(12)))
+        for _ in range(count)
+    ]
+
+
+CORPORA = {"random": make_segments, "templated": make_templated_segments}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Fuzzy index benchmark")
+    parser.add_argument("--entries", type=int, default=200_000, help="Number of indexed segments")
+    parser.add_argument("--queries", type=int, default=2_000, help="Number of timed queries")
+    parser.add_argument("--corpus", choices=CORPORA, default="random", help="Segment generator")
+    args = parser.parse_args()
+
+    segments = CORPORA[args.corpus](args.entries)
+    normalized = [main.normalize_segment(segment) for segment in segments]
+
+    index = main.FuzzyIndex()
+    started = time.perf_counter()
+    for position, segment in enumerate(normalized):
+        index.add(segment, position)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(1)
+    probes = rng.sample(range(args.entries), min(args.queries, args.entries))
+    # Near duplicates: a different number and trailing punctuation
+    queries = [segments[p].rsplit(" ", 1)[0] + f" {rng.randint(1000, 9999)}." for p in probes]
+
+    latencies = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        matches = index.query(main.normalize_segment(query))
+        latencies.append(time.perf_counter() - started)
+        found += bool(matches)
+
+    print(f"corpus:             {args.corpus}")
+    print(f"entries:            {args.entries}")
+    print(f"index build:        {build_seconds:.2f}s ({build_seconds / args.entries * 1e6:.1f}us/entry)")
+    print(f"query p50:          {percentile(latencies, 0.50) * 1e6:.0f}us")
+    print(f"query p99:          {percentile(latencies, 0.99) * 1e6:.0f}us")
+    print(f"query mean:         {statistics.mean(latencies) * 1e6:.0f}us")
+    print(f"near-duplicate hit: {found / len(queries):.2%}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
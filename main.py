@@ -1,13 +1,35 @@
 import asyncio
+import atexit
+import contextvars
+import functools
+import gzip
+import hashlib
+import inspect
+import json
 import os
 import logging
 import argparse
+import re
+import shutil
+import stat
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape, unescape as xml_unescape
 from typing import Any, Dict, List, Optional, Union
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import anyio.to_thread
 import deepl
+from deepl.api_data import GlossaryLanguagePair
 
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_context, get_http_headers
 
 
 # Load environment variables
@@ -19,33 +41,1496 @@ logger = logging.getLogger("deepl-fastmcp-server")
 
 # Constants
 TARGET_LANGUAGE = "EN-GB"
+JOURNAL_MODES = ("off", "record", "replay")
+DEFAULT_JOURNAL_PATH = "deepl_journal.jsonl.gz"
+DEFAULT_TRANSLATION_STORE_PATH = ":memory:"
+# Entry cap of the in-memory store; a file-backed store is unbounded unless configured
+DEFAULT_MEMORY_STORE_MAX_ENTRIES = 100_000
+TM_IMPORT_BATCH_SIZE = 1000
+TM_FORMATS = ("tmx", "xliff", "po", "journal")
+# Target languages DeepL distinguishes by region; all others use the bare language code
+REGIONAL_TARGET_LANGUAGES = {"EN-GB", "EN-US", "PT-BR", "PT-PT", "ZH-HANS", "ZH-HANT"}
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+FUZZY_NUM_BINS = 32
+FUZZY_BAND_SIZE = 4
+FUZZY_NGRAM_SIZE = 3
+FUZZY_MAX_CANDIDATES = 20
+# Most recently added segments of a band bucket considered per query
+FUZZY_MAX_BUCKET_SCAN = 256
+DEFAULT_FUZZY_THRESHOLD = 0.8
+# Segments read from SQLite per lock acquisition while a fuzzy index catches up
+FUZZY_REFRESH_BATCH_SIZE = 10_000
+# Tokens a fuzzy match may differ in and still be reused: inline tags and numbers
+FUZZY_TOKEN_PATTERN = re.compile(r"</?[A-Za-z][^<>]*>|\d+(?:[.,]\d+)*")
+# Protected spans masked before translation: URLs, inline tags, format placeholders and numbers
+PROTECTED_PATTERN = re.compile(
+    r"https?://[^\s<>\"']*[^\s<>\"'.,;:!?)]"
+    r"|</?[A-Za-z][\w:.-]*(?:\s[^<>]*)?/?>"
+    r"|\{[^{}\s]*\}"
+    r"|%(?:\(\w+\))?(?:\d+\$)?[-+#0]*\d*(?:\.\d+)?[sdifuxXeEgGc]"
+    r"|\d+(?:[.,]\d+)*"
+)
+PLACEHOLDER_TAG = "x"
+PLACEHOLDER_PATTERN = re.compile(r'<x id="(\d+)"\s*/>|<x id="(\d+)"\s*></x>')
+PLACEHOLDER_OPTIONS = {"tag_handling": "xml", "ignore_tags": PLACEHOLDER_TAG}
+XML_ENTITIES = {"&quot;": '"', "&apos;": "'"}
+INLINE_TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][\w:.-]*)(?:\s[^<>]*)?(/?)>$")
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+# Interactive requests granted in a row before a waiting bulk request gets a slot
+INTERACTIVE_BURST = 4
+QUEUE_TIME_SAMPLES = 1000
+# Per-type document limits, checked locally before upload
+DOCUMENT_SIZE_LIMITS = {
+    ".docx": 30 * 1024 * 1024,
+    ".pptx": 30 * 1024 * 1024,
+    ".xlsx": 30 * 1024 * 1024,
+    ".pdf": 30 * 1024 * 1024,
+    ".htm": 5 * 1024 * 1024,
+    ".html": 5 * 1024 * 1024,
+    ".txt": 1024 * 1024,
+    ".xlf": 10 * 1024 * 1024,
+    ".xliff": 10 * 1024 * 1024,
+    ".srt": 150 * 1024
+}
+DOCUMENT_SIGNATURES = {
+    ".docx": b"PK\x03\x04",
+    ".pptx": b"PK\x03\x04",
+    ".xlsx": b"PK\x03\x04",
+    ".pdf": b"%PDF-"
+}
+DOCUMENT_CHUNK_SIZE = 64 * 1024
+DOCUMENT_POLL_INTERVAL = 1
+DEFAULT_TRACE_PATH = "deepl_traces.jsonl"
+DEFAULT_PROFILE_PATH = "deepl_profile.folded"
+DEFAULT_PROFILE_SAMPLING_RATE = 100
+# OpenTelemetry span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+SPAN_STATUS_UNSET = 0
+SPAN_STATUS_ERROR = 2
+PO_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\"}
+# The process umask can only be read by setting it, so read it once at startup
+UMASK = os.umask(0)
+os.umask(UMASK)
 
 # Initialize FastMCP server
 mcp = FastMCP("DeepL Translation Server")
 
 
+def iter_journal(path: str):
+    """Yield the records of a DeepL request journal in the order they were written"""
+    with gzip.open(path, "rt", encoding="utf-8") as journal:
+        try:
+            for line in journal:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # The recording process did not exit cleanly; everything up to the
+            # last flushed record is still readable.
+            logger.warning(f"Journal {path} is truncated, stopped at last complete record")
+
+
+def _journal_key(text: str, options: Dict[str, Any]) -> str:
+    """Build the lookup key of a single translate_text request"""
+    return json.dumps([text, options], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _encode_usage(usage) -> Dict[str, int]:
+    """Serialize a deepl.Usage in the shape of the API response it is built from"""
+    encoded = {}
+    for prefix in ("character", "document", "team_document"):
+        detail = getattr(usage, prefix)
+        for field in ("count", "limit"):
+            if getattr(detail, field) is not None:
+                encoded[f"{prefix}_{field}"] = getattr(detail, field)
+    return encoded
+
+
+# Argument-free translator reads and how their results are written to and read from the journal
+JOURNALED_READS = {
+    "get_usage": (_encode_usage, deepl.Usage),
+    "get_source_languages": (
+        lambda languages: [{"code": lang.code, "name": lang.name} for lang in languages],
+        lambda languages: [deepl.Language(**lang) for lang in languages]
+    ),
+    "get_target_languages": (
+        lambda languages: [
+            {"code": lang.code, "name": lang.name, "supports_formality": lang.supports_formality}
+            for lang in languages
+        ],
+        lambda languages: [deepl.Language(**lang) for lang in languages]
+    ),
+    "get_glossary_languages": (
+        lambda pairs: [{"source_lang": pair.source_lang, "target_lang": pair.target_lang} for pair in pairs],
+        lambda pairs: [GlossaryLanguagePair(**pair) for pair in pairs]
+    )
+}
+
+
+class JournalingTranslator:
+    """
+    Wrap a DeepL translator to record translate_text calls and the usage, language
+    and glossary language reads to an append-only gzip-compressed JSONL journal,
+    or to replay them from it without network access. All other translator
+    methods are delegated to the wrapped translator.
+    """
+
+    def __init__(self, translator: Optional[deepl.Translator], mode: str, path: str):
+        self.translator = translator
+        self.mode = mode
+        self.path = path
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._journal = None
+        self._replay_index = {}
+        self._replay_reads = {}
+
+        if mode == "replay":
+            self._load_replay_index()
+        else:
+            self._journal = gzip.open(path, "at", encoding="utf-8")
+            atexit.register(self.close)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self.translator is None:
+            raise deepl.DeepLException(
+                f"'{name}' is not available in journal replay mode without DEEPL_AUTH_KEY"
+            )
+        return getattr(self.translator, name)
+
+    def _load_replay_index(self):
+        """Index every recorded text by its request options, and keep the latest result of each read"""
+        for record in iter_journal(self.path):
+            if record.get("method") in JOURNALED_READS:
+                self._replay_reads[record["method"]] = record["result"]
+                continue
+            if record.get("method") != "translate_text":
+                continue
+            texts = record["text"] if isinstance(record["text"], list) else [record["text"]]
+            for text, result in zip(texts, record["results"]):
+                self._replay_index[_journal_key(text, record["options"])] = result
+        logger.info(
+            f"Loaded {len(self._replay_index)} journal entries and {len(self._replay_reads)} reads from {self.path}"
+        )
+
+    def translate_text(self, text: Union[str, List[str]], **options):
+        if self.mode == "replay":
+            return self._replay(text, options)
+
+        result = self.translator.translate_text(text, **options)
+        results = result if isinstance(result, list) else [result]
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "method": "translate_text",
+            "text": text,
+            "options": options,
+            "results": [
+                {
+                    "text": r.text,
+                    "detected_source_lang": r.detected_source_lang,
+                    "billed_characters": getattr(r, "billed_characters", None)
+                }
+                for r in results
+            ]
+        }
+        self._write(record)
+        return result
+
+    def get_usage(self):
+        return self._journaled_read("get_usage")
+
+    def get_source_languages(self):
+        return self._journaled_read("get_source_languages")
+
+    def get_target_languages(self):
+        return self._journaled_read("get_target_languages")
+
+    def get_glossary_languages(self):
+        return self._journaled_read("get_glossary_languages")
+
+    def _journaled_read(self, method: str):
+        """Serve one of JOURNALED_READS, recording or replaying its result"""
+        encode, decode = JOURNALED_READS[method]
+        if self.mode == "replay":
+            if method not in self._replay_reads:
+                raise deepl.DeepLException(f"No journal entry for {method}")
+            with self._lock:
+                self.replayed += 1
+            return decode(self._replay_reads[method])
+
+        result = getattr(self.translator, method)()
+        self._write({
+            "timestamp": datetime.now().isoformat(),
+            "method": method,
+            "result": encode(result)
+        })
+        return result
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            self.recorded += 1
+
+    def _replay(self, text: Union[str, List[str]], options: Dict[str, Any]):
+        """Serve a translate_text call from the journal"""
+        texts = text if isinstance(text, list) else [text]
+        results = []
+        for item in texts:
+            entry = self._replay_index.get(_journal_key(item, options))
+            if entry is None:
+                raise deepl.DeepLException(f"No journal entry for request: {item[:100]!r}")
+            results.append(deepl.TextResult(
+                text=entry["text"],
+                detected_source_lang=entry["detected_source_lang"],
+                billed_characters=entry.get("billed_characters") or 0
+            ))
+        with self._lock:
+            self.replayed += 1
+        return results if isinstance(text, list) else results[0]
+
+    def close(self):
+        """Close the journal, writing the gzip trailer"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+def normalize_language_code(code: str, target: bool = False) -> str:
+    """Map a locale such as 'de_DE' or 'en-gb' to the matching DeepL language code"""
+    code = code.replace("_", "-").upper()
+    if target and code in REGIONAL_TARGET_LANGUAGES:
+        return code
+    return code.split("-")[0]
+
+
+def normalize_segment(text: str) -> str:
+    """Normalize a segment for fuzzy matching, ignoring case, whitespace and digits"""
+    return re.sub(r"\d+", "#", " ".join(text.lower().split()))
+
+
+def adapt_fuzzy_match(text: str, source_text: str, translated_text: str) -> Optional[str]:
+    """
+    Reuse the translation of a segment that differs from text only in numbers and
+    inline tags by substituting them. Returns None when the substitution is not safe.
+    """
+    if FUZZY_TOKEN_PATTERN.sub("\x00", text) != FUZZY_TOKEN_PATTERN.sub("\x00", source_text):
+        return None
+
+    source_tokens = FUZZY_TOKEN_PATTERN.findall(source_text)
+    mapping = {}
+    for old, new in zip(source_tokens, FUZZY_TOKEN_PATTERN.findall(text)):
+        if mapping.setdefault(old, new) != new:
+            return None
+
+    # A changed token must appear in the translation as often as in the source;
+    # otherwise the translation spells it out or drops it and cannot be adapted
+    source_counts = Counter(source_tokens)
+    translated_counts = Counter(FUZZY_TOKEN_PATTERN.findall(translated_text))
+    if any(old != new and translated_counts[old] != source_counts[old] for old, new in mapping.items()):
+        return None
+
+    unmapped = []
+    def substitute(match):
+        token = match.group(0)
+        if token not in mapping:
+            unmapped.append(token)
+        return mapping.get(token, token)
+
+    adapted = FUZZY_TOKEN_PATTERN.sub(substitute, translated_text)
+    return None if unmapped else adapted
+
+
+def mask_placeholders(text: str) -> tuple:
+    """
+    Replace URLs, inline tags, format placeholders and numbers with numbered
+    <x id="N"/> tags and escape the rest for DeepL XML tag handling.
+    Returns the masked text and the list of masked spans.
+    """
+    placeholders = []
+    pieces = []
+    last = 0
+    for match in PROTECTED_PATTERN.finditer(text):
+        pieces.append(xml_escape(text[last:match.start()]))
+        pieces.append(f'<{PLACEHOLDER_TAG} id="{len(placeholders)}"/>')
+        placeholders.append(match.group(0))
+        last = match.end()
+    pieces.append(xml_escape(text[last:]))
+    return "".join(pieces), placeholders
+
+
+def pair_inline_tags(placeholders: List[str]) -> Dict[int, int]:
+    """
+    Map the index of each closing tag among the masked spans to the index of the
+    opening tag it closes. Void and unbalanced tags stay unpaired.
+    """
+    pairs = {}
+    stack = []
+    for index, span in enumerate(placeholders):
+        match = INLINE_TAG_PATTERN.match(span)
+        if not match or match.group(3):
+            continue
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((name, index))
+            continue
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][0] == name:
+                pairs[index] = stack[depth][1]
+                del stack[depth:]
+                break
+    return pairs
+
+
+def restore_placeholders(masked_text: str, placeholders: List[str]) -> Optional[str]:
+    """
+    Put the masked spans back into a translated text. Returns None unless every
+    placeholder appears exactly once and paired inline tags come back in order
+    and properly nested.
+    """
+    pieces = []
+    seen = []
+    last = 0
+    for match in PLACEHOLDER_PATTERN.finditer(masked_text):
+        index = int(match.group(1) or match.group(2))
+        if index >= len(placeholders):
+            return None
+        pieces.append(xml_unescape(masked_text[last:match.start()], XML_ENTITIES))
+        pieces.append(placeholders[index])
+        seen.append(index)
+        last = match.end()
+    pieces.append(xml_unescape(masked_text[last:], XML_ENTITIES))
+    if sorted(seen) != list(range(len(placeholders))):
+        return None
+    pairs = pair_inline_tags(placeholders)
+    opening = set(pairs.values())
+    stack = []
+    for index in seen:
+        if index in opening:
+            stack.append(index)
+        elif index in pairs:
+            if not stack or stack.pop() != pairs[index]:
+                return None
+    return "".join(pieces)
+
+
+class FuzzyIndex:
+    """
+    MinHash LSH index over character n-grams of normalized segments. Signatures
+    use one-permutation hashing, so building a signature costs one hash per n-gram;
+    candidates sharing a band bucket are ranked by shared bands and verified with
+    the exact n-gram Jaccard similarity. Each distinct normalized segment is indexed
+    once, so templated strings that differ only in numbers share one entry.
+    """
+
+    def __init__(
+        self,
+        num_bins: int = FUZZY_NUM_BINS,
+        band_size: int = FUZZY_BAND_SIZE,
+        ngram_size: int = FUZZY_NGRAM_SIZE
+    ):
+        self.num_bins = num_bins
+        self.band_size = band_size
+        self.ngram_size = ngram_size
+        self._buckets = [{} for _ in range(num_bins // band_size)]
+        self._segments = []
+        self._payloads = []
+        self._positions = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _ngrams(self, segment: str) -> set:
+        padded = f" {segment} "
+        n = self.ngram_size
+        return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+    def _bands(self, ngrams: set) -> List[int]:
+        k = self.num_bins
+        signature = [None] * k
+        for ngram in ngrams:
+            h = hash(ngram)
+            current = signature[h % k]
+            if current is None or h < current:
+                signature[h % k] = h
+
+        # Densify: an empty bin borrows the value of the next non-empty bin
+        filled = [i for i in range(k) if signature[i] is not None]
+        if filled and len(filled) < k:
+            for i in range(k):
+                if signature[i] is None:
+                    j = next((f for f in filled if f > i), filled[0])
+                    signature[i] = (signature[j], (j - i) % k)
+
+        r = self.band_size
+        return [hash(tuple(signature[i:i + r])) for i in range(0, k, r)]
+
+    def add(self, segment: str, payload: Any):
+        """Index a normalized segment"""
+        self._size += 1
+        position = self._positions.get(segment)
+        if position is not None:
+            self._payloads[position].append(payload)
+            return
+        position = len(self._segments)
+        self._positions[segment] = position
+        self._segments.append(segment)
+        self._payloads.append([payload])
+        for buckets, band in zip(self._buckets, self._bands(self._ngrams(segment))):
+            buckets.setdefault(band, []).append(position)
+
+    def query(self, segment: str, threshold: float = DEFAULT_FUZZY_THRESHOLD, limit: int = 3) -> List[tuple]:
+        """
+        Return up to limit (similarity, payload) pairs at or above threshold, best
+        first. Payloads of the same segment are returned newest first.
+        """
+        ngrams = self._ngrams(segment)
+        shared_bands = Counter()
+        for buckets, band in zip(self._buckets, self._bands(ngrams)):
+            shared_bands.update(buckets.get(band, ())[-FUZZY_MAX_BUCKET_SCAN:])
+
+        matches = []
+        for position, _ in shared_bands.most_common(FUZZY_MAX_CANDIDATES):
+            other = self._ngrams(self._segments[position])
+            similarity = len(ngrams & other) / len(ngrams | other)
+            if similarity >= threshold:
+                matches.append((similarity, position))
+        matches.sort(key=lambda match: match[0], reverse=True)
+
+        results = []
+        for similarity, position in matches:
+            for payload in reversed(self._payloads[position][-limit:]):
+                results.append((similarity, payload))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+
+class TranslationStore:
+    """
+    Exact-match translation memory backed by SQLite. Segments are keyed by a
+    content hash of (target language, formality, source text), so repeated
+    imports and repeated translations are deduplicated. With max_entries, the
+    least recently written segments are evicted once the store is full.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRANSLATION_STORE_PATH, max_entries: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._fuzzy_indexes = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                content_hash TEXT PRIMARY KEY,
+                source_lang TEXT,
+                target_lang TEXT NOT NULL,
+                formality TEXT NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        # Document rows written without the output's size and mtime cannot be verified
+        document_columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if document_columns and "output_size" not in document_columns:
+            self._conn.execute("DROP TABLE documents")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                content_hash TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                formality TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                output_size INTEGER NOT NULL,
+                output_mtime_ns INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, target_lang, formality)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS segments_language ON segments (target_lang, formality)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+    @staticmethod
+    def content_hash(text: str, target_lang: str, formality: Optional[str] = None) -> str:
+        key = f"{normalize_language_code(target_lang, target=True)}\x1f{formality or 'default'}\x1f{text}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        text: str,
+        target_lang: str,
+        formality: Optional[str] = None,
+        source_lang: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Look up a stored translation, honouring an explicit source language"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translated_text, source_lang FROM segments WHERE content_hash = ?",
+                (self.content_hash(text, target_lang, formality),)
+            ).fetchone()
+            if row and source_lang and row[1] and row[1] != normalize_language_code(source_lang):
+                row = None
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not row:
+            return None
+        return {"translated_text": row[0], "detected_source_language": row[1]}
+
+    def put(
+        self,
+        text: str,
+        translated_text: str,
+        target_lang: str,
+        formality: Optional[str] = None,
+        source_lang: Optional[str] = None,
+        origin: str = "deepl"
+    ):
+        """Store a translation, replacing any previous one for the same segment"""
+        row = self._row(text, translated_text, target_lang, formality, source_lang, origin)
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT 1 FROM segments WHERE content_hash = ?", (row[0],)
+            ).fetchone() is not None
+            self._conn.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._entries += not replaced
+            self._evict()
+            self._conn.commit()
+
+    def put_many(self, segments: List[tuple], origin: str) -> int:
+        """
+        Insert (source_text, translated_text, source_lang, target_lang, formality)
+        tuples, keeping existing segments. Returns the number of new segments.
+        """
+        rows = [
+            self._row(text, translated, target_lang, formality, source_lang, origin)
+            for text, translated, source_lang, target_lang, formality in segments
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            inserted = self._conn.total_changes - before
+            self._entries += inserted
+            self._evict()
+            self._conn.commit()
+            return inserted
+
+    def _evict(self):
+        """Delete the oldest segments beyond max_entries. Caller holds the lock."""
+        if not self.max_entries or self._entries <= self.max_entries:
+            return
+        excess = self._entries - self.max_entries
+        # Replacing a segment gives it a new rowid, so rowid order is write order
+        self._conn.execute(
+            "DELETE FROM segments WHERE rowid IN (SELECT rowid FROM segments ORDER BY rowid LIMIT ?)", (excess,)
+        )
+        self._entries -= excess
+        self.evicted += excess
+        # Evicted segments stay in the fuzzy indexes until they are rebuilt
+        if sum(len(entry["index"]) for entry in self._fuzzy_indexes.values()) > 2 * self.max_entries:
+            self._fuzzy_indexes = {}
+
+    def _fuzzy_index(self, target_lang: str, formality: str) -> Dict[str, Any]:
+        """Get the fuzzy index entry of a language pair, creating an empty one on first use"""
+        key = (target_lang, formality)
+        with self._lock:
+            if key not in self._fuzzy_indexes:
+                self._fuzzy_indexes[key] = {"index": FuzzyIndex(), "last_rowid": 0, "lock": threading.Lock()}
+            return self._fuzzy_indexes[key]
+
+    def _refresh_fuzzy_index(self, entry: Dict[str, Any], target_lang: str, formality: str):
+        """
+        Add the segments written since the index was last refreshed. Rows are read
+        in batches under the store lock and indexed outside it, so exact lookups and
+        writes are not held up. Caller holds entry["lock"].
+        """
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, source_text FROM segments WHERE target_lang = ? AND formality = ? AND rowid > ? "
+                    "ORDER BY rowid LIMIT ?",
+                    (target_lang, formality, entry["last_rowid"], FUZZY_REFRESH_BATCH_SIZE)
+                ).fetchall()
+            for rowid, source_text in rows:
+                entry["index"].add(normalize_segment(source_text), rowid)
+            if rows:
+                entry["last_rowid"] = rows[-1][0]
+            if len(rows) < FUZZY_REFRESH_BATCH_SIZE:
+                return
+
+    def fuzzy_lookup(
+        self,
+        text: str,
+        target_lang: str,
+        formality: Optional[str] = None,
+        source_lang: Optional[str] = None,
+        threshold: float = DEFAULT_FUZZY_THRESHOLD,
+        limit: int = 3
+    ) -> List[Dict[str, Any]]:
+        """Find stored translations of segments similar to text, best first"""
+        target_lang = normalize_language_code(target_lang, target=True)
+        source_lang = normalize_language_code(source_lang) if source_lang else None
+        formality = formality or "default"
+        entry = self._fuzzy_index(target_lang, formality)
+        with entry["lock"]:
+            self._refresh_fuzzy_index(entry, target_lang, formality)
+            candidates = entry["index"].query(normalize_segment(text), threshold, limit * 2)
+
+        matches = []
+        with self._lock:
+            for similarity, rowid in candidates:
+                row = self._conn.execute(
+                    "SELECT source_text, translated_text, source_lang FROM segments WHERE rowid = ?", (rowid,)
+                ).fetchone()
+                # Replaced segments leave stale entries behind in the index
+                if not row or (source_lang and row[2] and row[2] != source_lang):
+                    continue
+                matches.append({
+                    "source_text": row[0],
+                    "translated_text": row[1],
+                    "source_language": row[2],
+                    "similarity": round(similarity, 4)
+                })
+        return matches[:limit]
+
+    def reuse_fuzzy_match(
+        self,
+        text: str,
+        target_lang: str,
+        formality: Optional[str] = None,
+        source_lang: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Adapt the closest stored translation that differs from text only in numbers and inline tags"""
+        for match in self.fuzzy_lookup(text, target_lang, formality, source_lang):
+            adapted = adapt_fuzzy_match(text, match["source_text"], match["translated_text"])
+            if adapted is not None:
+                return {
+                    "translated_text": adapted,
+                    "detected_source_language": match["source_language"],
+                    "fuzzy_match": {"source_text": match["source_text"], "similarity": match["similarity"]}
+                }
+        return None
+
+    def _row(self, text, translated_text, target_lang, formality, source_lang, origin) -> tuple:
+        return (
+            self.content_hash(text, target_lang, formality),
+            normalize_language_code(source_lang) if source_lang else None,
+            normalize_language_code(target_lang, target=True),
+            formality or "default",
+            text,
+            translated_text,
+            origin,
+            datetime.now().isoformat()
+        )
+
+    def get_document(self, content_hash: str, target_lang: str, formality: Optional[str] = None) -> Optional[str]:
+        """
+        Get the output path of an earlier translation of identical document content.
+        Returns None, and forgets the translation, if the output file has changed since.
+        """
+        key = (content_hash, normalize_language_code(target_lang, target=True), formality or "default")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_path, output_size, output_mtime_ns FROM documents "
+                "WHERE content_hash = ? AND target_lang = ? AND formality = ?",
+                key
+            ).fetchone()
+            if not row:
+                return None
+            try:
+                output_stat = os.stat(row[0])
+                unchanged = (output_stat.st_size, output_stat.st_mtime_ns) == (row[1], row[2])
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                self._conn.execute(
+                    "DELETE FROM documents WHERE content_hash = ? AND target_lang = ? AND formality = ?", key
+                )
+                self._conn.commit()
+                return None
+        return row[0]
+
+    def put_document(self, content_hash: str, target_lang: str, formality: Optional[str], output_path: str):
+        """Remember where the translation of a document's content was written"""
+        output_path = os.path.abspath(output_path)
+        output_stat = os.stat(output_path)
+        with self._lock:
+            # The file no longer holds whatever was written to it before
+            self._conn.execute("DELETE FROM documents WHERE output_path = ?", (output_path,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    content_hash,
+                    normalize_language_code(target_lang, target=True),
+                    formality or "default",
+                    output_path,
+                    output_stat.st_size,
+                    output_stat.st_mtime_ns,
+                    datetime.now().isoformat()
+                )
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all segments and documents and reset the hit counters"""
+        with self._lock:
+            self._conn.execute("DELETE FROM segments")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+            self._fuzzy_indexes = {}
+            self._entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries
+            fuzzy_entries = sum(len(entry["index"]) for entry in self._fuzzy_indexes.values())
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "evicted": self.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "fuzzy_index_entries": fuzzy_entries
+        }
+
+
+def _local_name(tag: str) -> str:
+    """Strip the namespace from an ElementTree tag"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _iter_xml_units(path: str, unit_names: tuple):
+    """
+    Stream the unit elements of an XML file as (event, element) pairs. Each unit
+    is detached from its parent once the caller is done with it, so memory use
+    stays constant regardless of file size.
+    """
+    stack = []
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            yield event, elem
+            continue
+        stack.pop()
+        if _local_name(elem.tag) in unit_names:
+            yield event, elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def iter_tmx_segments(path: str, source_language: Optional[str] = None, target_language: Optional[str] = None):
+    """Yield (source_text, translated_text, source_lang, target_lang, formality) tuples from a TMX file"""
+    source_lang = source_language
+    for event, elem in _iter_xml_units(path, ("tu",)):
+        name = _local_name(elem.tag)
+        if event == "start":
+            if name == "header" and not source_lang and elem.get("srclang") != "*all*":
+                source_lang = elem.get("srclang")
+            continue
+
+        variants = []
+        for tuv in elem:
+            lang = tuv.get(XML_LANG) or tuv.get("lang")
+            seg = next((child for child in tuv if _local_name(child.tag) == "seg"), None)
+            if _local_name(tuv.tag) == "tuv" and lang and seg is not None:
+                variants.append((lang, "".join(seg.itertext())))
+
+        tu_source = elem.get("srclang") if elem.get("srclang") not in (None, "*all*") else source_lang
+        if not tu_source:
+            continue
+        source_code = normalize_language_code(tu_source)
+        source_text = next((text for lang, text in variants if normalize_language_code(lang) == source_code), None)
+        if not source_text:
+            continue
+        for lang, text in variants:
+            target_code = normalize_language_code(lang, target=True)
+            if normalize_language_code(lang) == source_code or not text:
+                continue
+            if target_language and target_code != normalize_language_code(target_language, target=True):
+                continue
+            yield source_text, text, source_code, target_code, None
+
+
+def iter_xliff_segments(path: str, source_language: Optional[str] = None, target_language: Optional[str] = None):
+    """Yield (source_text, translated_text, source_lang, target_lang, formality) tuples from an XLIFF 1.2 or 2.x file"""
+    source_lang, target_lang = source_language, target_language
+    # XLIFF 2.x segments sit in a unit, which is detached once its segments are read
+    for event, elem in _iter_xml_units(path, ("trans-unit", "unit", "segment")):
+        name = _local_name(elem.tag)
+        if event == "start":
+            if name == "xliff":
+                source_lang = source_language or elem.get("srcLang") or source_lang
+                target_lang = target_language or elem.get("trgLang") or target_lang
+            elif name == "file":
+                source_lang = source_language or elem.get("source-language") or source_lang
+                target_lang = target_language or elem.get("target-language") or target_lang
+            continue
+        if name == "unit":
+            continue
+
+        texts = {_local_name(child.tag): "".join(child.itertext()) for child in elem}
+        if texts.get("source") and texts.get("target") and target_lang:
+            yield texts["source"], texts["target"], source_lang, target_lang, None
+
+
+def _po_unquote(value: str) -> str:
+    """Decode a quoted PO string"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return re.sub(r'\\(.)', lambda m: PO_ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _iter_po_entries(lines):
+    """Yield the entries of a PO file as dicts keyed by PO keyword"""
+    entry, field = {}, None
+    for raw in lines:
+        line = raw.strip()
+        if line.startswith('"') and field:
+            entry[field] += _po_unquote(line)
+            continue
+        if not line or line.startswith("#"):
+            if any(key.startswith("msgstr") for key in entry):
+                yield entry
+                entry = {}
+            if line.startswith("#,") and "fuzzy" in line:
+                entry["fuzzy"] = True
+            field = None
+            continue
+        keyword, _, value = line.partition(" ")
+        if keyword in ("msgctxt", "msgid") and any(key.startswith("msgstr") for key in entry):
+            yield entry
+            entry = {}
+        field = keyword
+        entry[field] = _po_unquote(value)
+    if any(key.startswith("msgstr") for key in entry):
+        yield entry
+
+
+def iter_po_segments(path: str, source_language: Optional[str] = None, target_language: Optional[str] = None):
+    """Yield (source_text, translated_text, source_lang, target_lang, formality) tuples from a gettext PO file"""
+    target_lang = target_language
+    with open(path, encoding="utf-8") as po:
+        for entry in _iter_po_entries(po):
+            msgid = entry.get("msgid", "")
+            msgstr = entry.get("msgstr", entry.get("msgstr[0]", ""))
+            if not msgid:
+                # The header entry carries the catalog language
+                match = re.search(r"^Language:\s*(\S+)", msgstr, re.MULTILINE)
+                if match and not target_language:
+                    target_lang = match.group(1)
+                continue
+            if msgstr and not entry.get("fuzzy") and target_lang:
+                yield msgid, msgstr, source_language, target_lang, None
+
+
+def iter_journal_segments(path: str, source_language: Optional[str] = None, target_language: Optional[str] = None):
+    """Yield (source_text, translated_text, source_lang, target_lang, formality) tuples from a request journal"""
+    for record in iter_journal(path):
+        options = record.get("options", {})
+        if record.get("method") != "translate_text":
+            continue
+        # Only plain and placeholder-masked requests are comparable with what the store serves
+        if options.get("preserve_formatting") or options.get("split_sentences"):
+            continue
+        if options.get("tag_handling") and options.get("ignore_tags") != PLACEHOLDER_TAG:
+            continue
+        if target_language and normalize_language_code(options["target_lang"], target=True) != normalize_language_code(target_language, target=True):
+            continue
+        texts = record["text"] if isinstance(record["text"], list) else [record["text"]]
+        for text, result in zip(texts, record["results"]):
+            yield (
+                text,
+                result["text"],
+                options.get("source_lang") or result.get("detected_source_lang"),
+                options["target_lang"],
+                options.get("formality")
+            )
+
+
+TM_PARSERS = {
+    "tmx": iter_tmx_segments,
+    "xliff": iter_xliff_segments,
+    "po": iter_po_segments,
+    "journal": iter_journal_segments
+}
+
+
+def detect_tm_format(path: str) -> Optional[str]:
+    """Guess the translation memory format from the file extension"""
+    name = path.lower()
+    if name.endswith(".tmx"):
+        return "tmx"
+    if name.endswith((".xlf", ".xliff")):
+        return "xliff"
+    if name.endswith((".po", ".pot")):
+        return "po"
+    if name.endswith((".jsonl", ".jsonl.gz")):
+        return "journal"
+    return None
+
+
+def validate_document(file_path: str) -> int:
+    """
+    Check a document against DeepL's format and size limits before upload.
+    Returns the file size in bytes and raises ValueError if the document is rejected.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in DOCUMENT_SIZE_LIMITS:
+        raise ValueError(
+            f"Unsupported document type '{extension}'; supported types: {', '.join(DOCUMENT_SIZE_LIMITS)}"
+        )
+
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
+        raise ValueError(f"File not found: {file_path}")
+
+    if file_size == 0:
+        raise ValueError(f"File is empty: {file_path}")
+    limit = DOCUMENT_SIZE_LIMITS[extension]
+    if file_size > limit:
+        raise ValueError(f"File size exceeds the {limit // 1024}KB limit for {extension} documents")
+
+    with open(file_path, "rb") as document:
+        head = document.read(8192)
+    signature = DOCUMENT_SIGNATURES.get(extension)
+    if signature and not head.startswith(signature):
+        raise ValueError(f"File content does not match the {extension} format")
+    if not signature and b"\x00" in head:
+        raise ValueError(f"File content is binary, expected a {extension} text document")
+
+    return file_size
+
+
+def write_file_atomic(output_path: str, write):
+    """
+    Call write with a temporary file next to output_path, then rename it into place.
+    The file keeps the permissions of the file it replaces; a new file gets the
+    permissions open() would give it.
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            write(temp_file)
+        try:
+            mode = stat.S_IMODE(os.stat(output_path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~UMASK
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class QueueFullError(Exception):
+    """Raised when the request scheduler rejects a request"""
+
+
+class RequestScheduler:
+    """
+    Admission control for DeepL-backed tools. At most max_concurrent requests run
+    at once, and one slot is always kept free of bulk work. Waiting requests are
+    queued per client and priority class. Free slots go to interactive requests
+    first and, within a class, round-robin across clients, so a single client
+    cannot starve the others. Requests beyond the queue depth are rejected at once.
+    Requests wait on the event loop, so a queued request does not hold a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue_depth: int = 100,
+        max_client_queue_depth: int = 20,
+        queue_timeout: float = 30.0
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_bulk_concurrent = max(1, max_concurrent - 1)
+        self.max_queue_depth = max_queue_depth
+        self.max_client_queue_depth = max_client_queue_depth
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_CLASSES}
+        self._queued = 0
+        self._interactive_streak = 0
+        self._counters = {
+            priority: {"admitted": 0, "rejected": 0, "timed_out": 0}
+            for priority in PRIORITY_CLASSES
+        }
+        self._queue_times = {priority: deque(maxlen=QUEUE_TIME_SAMPLES) for priority in PRIORITY_CLASSES}
+
+    async def acquire(self, client_id: str, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Wait for a request slot and return the seconds spent queued"""
+        started = time.monotonic()
+        with self._lock:
+            # Queued bulk requests do not hold up an interactive request that has a free slot
+            if not self._queues[priority] and self._can_run(priority):
+                self._active[priority] += 1
+                self._counters[priority]["admitted"] += 1
+                self._queue_times[priority].append(0.0)
+                return 0.0
+
+            client_depth = sum(len(clients.get(client_id, ())) for clients in self._queues.values())
+            if self._queued >= self.max_queue_depth or client_depth >= self.max_client_queue_depth:
+                self._counters[priority]["rejected"] += 1
+                raise QueueFullError(
+                    f"Server busy: {self._queued} requests queued, {client_depth} from this client"
+                )
+
+            ticket = asyncio.Event()
+            self._queues[priority].setdefault(client_id, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+
+        try:
+            await asyncio.wait_for(ticket.wait(), self.queue_timeout)
+        except TimeoutError:
+            with self._lock:
+                # A slot granted just as the wait timed out is still taken
+                if not ticket.is_set():
+                    self._withdraw(client_id, priority, ticket)
+                    self._counters[priority]["timed_out"] += 1
+                    raise QueueFullError(f"Request waited more than {self.queue_timeout}s for a free slot")
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket.is_set():
+                    self._active[priority] -= 1
+                    self._dispatch()
+                else:
+                    self._withdraw(client_id, priority, ticket)
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._queue_times[priority].append(waited)
+        return waited
+
+    def release(self, priority: str = PRIORITY_INTERACTIVE):
+        """Free a request slot and hand it to the next queued request"""
+        with self._lock:
+            self._active[priority] -= 1
+            self._dispatch()
+
+    def _can_run(self, priority: str) -> bool:
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        return priority == PRIORITY_INTERACTIVE or self._active[PRIORITY_BULK] < self.max_bulk_concurrent
+
+    def _withdraw(self, client_id: str, priority: str, ticket: asyncio.Event):
+        """Remove a ticket that gave up waiting. Caller holds the lock."""
+        clients = self._queues[priority]
+        clients[client_id].remove(ticket)
+        if not clients[client_id]:
+            del clients[client_id]
+        self._queued -= 1
+
+    def _next_priority(self) -> Optional[str]:
+        """Pick the class of the next grant. Caller holds the lock."""
+        interactive_ready = bool(self._queues[PRIORITY_INTERACTIVE]) and self._can_run(PRIORITY_INTERACTIVE)
+        bulk_ready = bool(self._queues[PRIORITY_BULK]) and self._can_run(PRIORITY_BULK)
+        # Let bulk work through now and then so it is never starved completely
+        if interactive_ready and not (bulk_ready and self._interactive_streak >= INTERACTIVE_BURST):
+            self._interactive_streak += 1
+            return PRIORITY_INTERACTIVE
+        if bulk_ready:
+            self._interactive_streak = 0
+            return PRIORITY_BULK
+        return None
+
+    def _dispatch(self):
+        """Grant free slots to queued requests. Caller holds the lock and runs on the event loop."""
+        priority = self._next_priority()
+        while priority is not None:
+            clients = self._queues[priority]
+            # Serve the head of the first client's queue, then move that client to the back
+            client_id, queue = next(iter(clients.items()))
+            ticket = queue.popleft()
+            del clients[client_id]
+            if queue:
+                clients[client_id] = queue
+            self._queued -= 1
+            self._active[priority] += 1
+            self._counters[priority]["admitted"] += 1
+            ticket.set()
+            priority = self._next_priority()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            classes = {}
+            for priority in PRIORITY_CLASSES:
+                samples = sorted(self._queue_times[priority])
+                classes[priority] = {
+                    **self._counters[priority],
+                    "active": self._active[priority],
+                    "queued": sum(len(queue) for queue in self._queues[priority].values()),
+                    "queue_time_ms": {
+                        "p50": round(samples[len(samples) // 2] * 1000, 2) if samples else 0,
+                        "p99": round(samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000, 2) if samples else 0,
+                        "max": round(samples[-1] * 1000, 2) if samples else 0
+                    }
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue_depth": self.max_queue_depth,
+                "max_client_queue_depth": self.max_client_queue_depth,
+                "queue_timeout_seconds": self.queue_timeout,
+                "queued": self._queued,
+                "classes": classes
+            }
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls: the first caller for a key runs the call,
+    and callers arriving while it is in flight wait for it and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = Counter()
+        self._shared = Counter()
+
+    def do(self, key: tuple, fn):
+        """Run fn for key, or wait for the identical call already in flight. key[0] names the call."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                self._executed[key[0]] += 1
+            else:
+                self._shared[key[0]] += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executed": sum(self._executed.values()),
+                "shared": sum(self._shared.values()),
+                "in_flight": len(self._calls),
+                "by_call": {
+                    name: {"executed": self._executed[name], "shared": self._shared[name]}
+                    for name in sorted(set(self._executed) | set(self._shared))
+                }
+            }
+
+
+def confine_path(path: str, directory: str) -> str:
+    """
+    Resolve a client-supplied output path, relative paths against directory.
+    Raises ValueError unless the resolved path lies inside directory.
+    """
+    resolved = os.path.realpath(os.path.join(directory, path))
+    if resolved == directory or os.path.commonpath([resolved, directory]) != directory:
+        raise ValueError(f"Output path must be a file in {directory}")
+    return resolved
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Encode an attribute value as an OTLP/JSON AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    Opt-in span tracing. Spans nest through a context variable, so every tool call
+    forms its own trace, and each finished trace is appended to a local file as one
+    OpenTelemetry (OTLP/JSON) export request per line.
+    """
+
+    def __init__(self, enabled: bool = False, output_path: str = DEFAULT_TRACE_PATH):
+        self.enabled = enabled
+        self.output_path = output_path
+        # Paths set at runtime must stay in the directory of the configured path
+        self.output_dir = os.path.dirname(os.path.realpath(output_path))
+        self.exported_traces = 0
+        self._current = contextvars.ContextVar("deepl_current_span", default=None)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool, output_path: Optional[str] = None):
+        if output_path:
+            output_path = confine_path(output_path, self.output_dir)
+        with self._lock:
+            self.enabled = enabled
+            if output_path:
+                self.output_path = output_path
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        """Record the enclosed block as a span; yields None while tracing is disabled"""
+        if not self.enabled:
+            yield None
+            return
+
+        parent = self._current.get()
+        span = {
+            "traceId": parent["traceId"] if parent else os.urandom(16).hex(),
+            "spanId": os.urandom(8).hex(),
+            "parentSpanId": parent["spanId"] if parent else "",
+            "name": name,
+            "kind": kind,
+            "startTimeUnixNano": time.time_ns(),
+            "attributes": dict(attributes),
+            "status": {"code": SPAN_STATUS_UNSET}
+        }
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span["status"] = {"code": SPAN_STATUS_ERROR, "message": str(e)}
+            raise
+        finally:
+            self._current.reset(token)
+            span["endTimeUnixNano"] = time.time_ns()
+            self._finish(span, is_root=parent is None)
+
+    @staticmethod
+    def annotate(span: Optional[Dict[str, Any]], **attributes):
+        """Add attributes to a span returned by span(), if tracing is enabled"""
+        if span is not None:
+            span["attributes"].update(attributes)
+
+    def _finish(self, span: Dict[str, Any], is_root: bool):
+        with self._lock:
+            spans = self._pending.setdefault(span["traceId"], [])
+            spans.append(span)
+            if not is_root:
+                return
+            del self._pending[span["traceId"]]
+            export = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(mcp.name)}]},
+                    "scopeSpans": [{
+                        "scope": {"name": logger.name},
+                        "spans": [
+                            {
+                                **s,
+                                "startTimeUnixNano": str(s["startTimeUnixNano"]),
+                                "endTimeUnixNano": str(s["endTimeUnixNano"]),
+                                "attributes": [
+                                    {"key": key, "value": _otlp_value(value)}
+                                    for key, value in s["attributes"].items()
+                                ]
+                            }
+                            for s in spans
+                        ]
+                    }]
+                }]
+            }
+            try:
+                with open(self.output_path, "a", encoding="utf-8") as trace_file:
+                    trace_file.write(json.dumps(export, ensure_ascii=False) + "\n")
+                self.exported_traces += 1
+            except OSError as e:
+                logger.error(f"Failed to export trace to {self.output_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "output_path": self.output_path,
+            "exported_traces": self.exported_traces
+        }
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler. A background thread samples the stacks of all
+    other threads at a fixed rate; on stop, the samples are written as collapsed
+    stacks, the input format of flame graph tools.
+    """
+
+    def __init__(self, output_path: str = DEFAULT_PROFILE_PATH):
+        self.sampling_rate = DEFAULT_PROFILE_SAMPLING_RATE
+        self.output_path = output_path
+        # Paths set at runtime must stay in the directory of the configured path
+        self.output_dir = os.path.dirname(os.path.realpath(output_path))
+        self.started_at = None
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._control_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, sampling_rate: int = DEFAULT_PROFILE_SAMPLING_RATE, output_path: Optional[str] = None):
+        """Start sampling, restarting with the new settings if already running"""
+        if sampling_rate <= 0:
+            raise ValueError("sampling_rate must be a positive number of samples per second")
+        if output_path:
+            output_path = confine_path(output_path, self.output_dir)
+        with self._control_lock:
+            if self.running:
+                self._stop_sampling()
+            self.sampling_rate = sampling_rate
+            self.output_path = output_path or self.output_path
+            self.started_at = datetime.now()
+            self._samples = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="deepl-sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = 1 / self.sampling_rate
+        own_id = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    self._samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and write the collapsed stacks to the output path"""
+        with self._control_lock:
+            return self._stop_sampling()
+
+    def _stop_sampling(self) -> Dict[str, Any]:
+        """Stop the sampling thread and write its samples. Caller holds the control lock."""
+        if not self.running:
+            return self.status()
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            samples = self._samples
+        with open(self.output_path, "w", encoding="utf-8") as profile_file:
+            for stack, count in samples.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        return dict(self.status(), samples=sum(samples.values()), unique_stacks=len(samples))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sum(self._samples.values())
+        return {
+            "running": self.running,
+            "sampling_rate": self.sampling_rate,
+            "output_path": self.output_path,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "samples": samples
+        }
+
+
 class DeepLTranslationServer:
     def __init__(self):
         self.translator = None
         self.translation_history = []
         self.usage_cache = {}
         self.cache_timestamp = None
-        self.initialize_deepl()
+        self.protect_placeholders = os.getenv("DEEPL_PROTECT_PLACEHOLDERS", "false").lower() in ("1", "true", "yes")
+        self.use_translation_store = os.getenv("DEEPL_USE_TRANSLATION_STORE", "true").lower() in ("1", "true", "yes")
+        store_path = os.getenv("DEEPL_TRANSLATION_STORE", DEFAULT_TRANSLATION_STORE_PATH)
+        default_max_entries = DEFAULT_MEMORY_STORE_MAX_ENTRIES if store_path == ":memory:" else 0
+        self.translation_store = TranslationStore(
+            store_path,
+            max_entries=int(os.getenv("DEEPL_TRANSLATION_STORE_MAX_ENTRIES", default_max_entries)) or None
+        )
+        self.single_flight = SingleFlight()
+        self.tracer = Tracer(
+            enabled=os.getenv("DEEPL_TRACING", "false").lower() in ("1", "true", "yes"),
+            output_path=os.getenv("DEEPL_TRACE_PATH", DEFAULT_TRACE_PATH)
+        )
+        self.profiler = SamplingProfiler(os.getenv("DEEPL_PROFILE_PATH", DEFAULT_PROFILE_PATH))
+        self.scheduler = RequestScheduler(
+            max_concurrent=int(os.getenv("DEEPL_MAX_CONCURRENT_REQUESTS", 4)),
+            max_queue_depth=int(os.getenv("DEEPL_MAX_QUEUE_DEPTH", 100)),
+            max_client_queue_depth=int(os.getenv("DEEPL_MAX_CLIENT_QUEUE_DEPTH", 20)),
+            queue_timeout=float(os.getenv("DEEPL_QUEUE_TIMEOUT", 30))
+        )
+        self._translator_lock = threading.Lock()
+    
+    def get_translator(self):
+        """Get the DeepL translator, initializing it on first use so offline commands need no API key"""
+        with self._translator_lock:
+            if self.translator is None:
+                self.initialize_deepl()
+            return self.translator
     
     def initialize_deepl(self):
         """Initialize DeepL translator"""
         auth_key = os.getenv("DEEPL_AUTH_KEY")
         server_url = os.getenv("DEEPL_SERVER_URL", "https://api-free.deepl.com")
+        journal_mode = os.getenv("DEEPL_JOURNAL_MODE", "off").lower()
+        journal_path = os.getenv("DEEPL_JOURNAL_PATH", DEFAULT_JOURNAL_PATH)
         
-        if not auth_key:
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"DEEPL_JOURNAL_MODE must be one of {', '.join(JOURNAL_MODES)}")
+        
+        # Replaying a journal needs no network access, so the key is optional there
+        if not auth_key and journal_mode != "replay":
             raise ValueError("DEEPL_AUTH_KEY environment variable is required")
         
         try:
-            self.translator = deepl.Translator(auth_key, server_url=server_url)
+            translator = None
+            if auth_key:
+                translator = deepl.Translator(auth_key, server_url=server_url)
+
+                # Test the connection
+                usage = translator.get_usage()
+                logger.info(f"DeepL initialized. Usage: {usage.character.count}/{usage.character.limit}")
+
+            if journal_mode != "off":
+                translator = JournalingTranslator(translator, journal_mode, journal_path)
+                logger.info(f"DeepL journal {journal_mode} mode enabled: {journal_path}")
 
-            # Test the connection
-            usage = self.translator.get_usage()
-            logger.info(f"DeepL initialized. Usage: {usage.character.count}/{usage.character.limit}")
+            self.translator = translator
         except Exception as e:
             logger.error(f"Failed to initialize DeepL: {e}")
             raise
@@ -62,6 +1547,18 @@ class DeepLTranslationServer:
         if len(self.translation_history) > 100:
             self.translation_history = self.translation_history[-100:]
     
+    def call_deepl(self, method: str, *args, **kwargs):
+        """
+        Call a translator method. Concurrent calls with the same method and
+        arguments share a single in-flight DeepL request.
+        """
+        key = (method, json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str))
+        with self.tracer.span(f"deepl.{method}", kind=SPAN_KIND_CLIENT, **{"single_flight.shared": True}) as span:
+            def execute():
+                self.tracer.annotate(span, **{"single_flight.shared": False})
+                return getattr(self.get_translator(), method)(*args, **kwargs)
+            return self.single_flight.do(key, execute)
+    
     def _get_cached_usage(self) -> Optional[Dict[str, Any]]:
         """Get cached usage info if recent enough"""
         if (self.cache_timestamp and 
@@ -72,7 +1569,162 @@ class DeepLTranslationServer:
 # Initialize server instance
 server = DeepLTranslationServer()
 
+
+def _translate_segments(
+    texts: List[str],
+    options: Dict[str, Any],
+    use_store: bool = True,
+    reuse_fuzzy_matches: bool = False,
+    protect_placeholders: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Translate texts through the translation store, sending only unknown unique
+    segments to DeepL in a single request. With protect_placeholders, numbers,
+    format placeholders, URLs and inline tags are masked first, so templated
+    strings share one store entry and one billed translation.
+    """
+    store = server.translation_store if use_store else None
+    target_lang = options["target_lang"]
+    source_lang = options.get("source_lang")
+    formality = options.get("formality")
+
+    masked = {text: mask_placeholders(text) if protect_placeholders else (text, []) for text in texts}
+    request_options = dict(options)
+    xml_request = any(request_text != text for text, (request_text, _) in masked.items())
+    if xml_request:
+        request_options.update(PLACEHOLDER_OPTIONS)
+
+    entries = {}
+    unique_requests = list(dict.fromkeys(request_text for request_text, _ in masked.values()))
+    if store:
+        with server.tracer.span("translation_store.lookup", segments=len(unique_requests)) as span:
+            for request_text in unique_requests:
+                hit = store.get(request_text, target_lang, formality, source_lang)
+                if not hit and reuse_fuzzy_matches:
+                    hit = store.reuse_fuzzy_match(request_text, target_lang, formality, source_lang)
+                if hit:
+                    entries[request_text] = dict(hit, from_cache=True)
+            server.tracer.annotate(span, hits=len(entries))
+
+    missing = [request_text for request_text in unique_requests if request_text not in entries]
+    if missing:
+        result = server.call_deepl(
+            "translate_text",
+            missing[0] if len(texts) == 1 else missing,
+            **request_options
+        )
+        results = result if isinstance(result, list) else [result]
+        for request_text, translated in zip(missing, results):
+            translated_text = translated.text
+            if xml_request and request_text in masked and masked[request_text][0] == request_text:
+                # Sent unmasked but in XML mode, so the result is escaped like the masked ones
+                translated_text = xml_unescape(translated_text, XML_ENTITIES)
+            entries[request_text] = {
+                "translated_text": translated_text,
+                "detected_source_language": translated.detected_source_lang,
+                "from_cache": False
+            }
+
+    translations = []
+    broken = set()
+    for text in texts:
+        request_text, placeholders = masked[text]
+        entry = dict(entries[request_text])
+        if request_text != text:
+            restored = restore_placeholders(entry["translated_text"], placeholders)
+            if restored is None:
+                # DeepL dropped or duplicated a placeholder; translate the raw text instead
+                logger.warning(f"Placeholder mismatch, retranslating without masking: {text[:100]!r}")
+                broken.add(request_text)
+                translated = server.call_deepl("translate_text", text, **options)
+                entry = {
+                    "translated_text": translated.text,
+                    "detected_source_language": translated.detected_source_lang,
+                    "from_cache": False
+                }
+            else:
+                entry["translated_text"] = restored
+                entry["placeholders_protected"] = len(placeholders)
+        translations.append(entry)
+
+    if store:
+        for request_text in missing:
+            if request_text not in broken:
+                entry = entries[request_text]
+                store.put(
+                    request_text,
+                    entry["translated_text"],
+                    target_lang,
+                    formality,
+                    entry["detected_source_language"]
+                )
+
+    return translations
+
+
+def _client_id() -> str:
+    """Identify the calling MCP client by its API key, falling back to its session"""
+    headers = get_http_headers(include_all=True)
+    api_key = headers.get("x-api-key") or headers.get("authorization")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    try:
+        return "session:" + get_context().session_id
+    except Exception:
+        return "default"
+
+
+def scheduled(priority: str):
+    """
+    Run a tool under the request scheduler, rejecting it fast when the queues are full.
+    The wrapped tool becomes async: it waits for a slot on the event loop and only
+    then takes a worker thread to run the tool body.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                with server.tracer.span("scheduler.queue", priority=priority) as span:
+                    waited = await server.scheduler.acquire(_client_id(), priority)
+                    server.tracer.annotate(span, queue_time_ms=round(waited * 1000, 3))
+            except QueueFullError as e:
+                logger.warning(f"Rejected {fn.__name__}: {e}")
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
+            try:
+                return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+            finally:
+                server.scheduler.release(priority)
+        return wrapper
+    return decorator
+
+
+def traced(fn):
+    """Record a span for every invocation of a tool"""
+    def finish(span, result):
+        if span is not None and isinstance(result, dict) and result.get("success") is False:
+            span["status"] = {"code": SPAN_STATUS_ERROR, "message": str(result.get("error"))}
+        return result
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with server.tracer.span(f"tools/call {fn.__name__}", **{"mcp.tool.name": fn.__name__}) as span:
+                return finish(span, await fn(*args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with server.tracer.span(f"tools/call {fn.__name__}", **{"mcp.tool.name": fn.__name__}) as span:
+            return finish(span, fn(*args, **kwargs))
+    return wrapper
+
+
 @mcp.tool()
+@traced
+@scheduled(PRIORITY_INTERACTIVE)
 def translate_text(
     text: str,
     target_language: str,
@@ -80,7 +1732,10 @@ def translate_text(
     formality: Optional[str] = None,
     preserve_formatting: bool = False,
     split_sentences: Optional[str] = None,
-    tag_handling: Optional[str] = None
+    tag_handling: Optional[str] = None,
+    reuse_fuzzy_matches: bool = False,
+    protect_placeholders: Optional[bool] = None,
+    use_translation_store: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Translate text to a target language using DeepL API
@@ -93,6 +1748,9 @@ def translate_text(
         preserve_formatting: Whether to preserve formatting
         split_sentences: How to split sentences ('0'=no splitting, '1'=split on punctuation, 'nonewlines'=split on punctuation except newlines)
         tag_handling: How to handle tags ('xml', 'html')
+        reuse_fuzzy_matches: Reuse a stored translation of a segment that differs only in numbers or inline tags
+        protect_placeholders: Mask numbers, format placeholders, URLs and inline tags during translation (server default if not provided; ignored with tag_handling)
+        use_translation_store: Answer from and save to the translation store (server default if not provided)
     """
     try:
         # Prepare translation options
@@ -113,21 +1771,42 @@ def translate_text(
         if tag_handling:
             options["tag_handling"] = tag_handling
         
-        result = server.translator.translate_text(text, **options)
+        if protect_placeholders is None:
+            protect_placeholders = server.protect_placeholders
+        
+        if use_translation_store is None:
+            use_translation_store = server.use_translation_store
+        
+        # Only plain requests are answered from the translation store
+        entry = _translate_segments(
+            [text],
+            options,
+            use_store=use_translation_store and not (preserve_formatting or split_sentences or tag_handling),
+            reuse_fuzzy_matches=reuse_fuzzy_matches,
+            protect_placeholders=protect_placeholders and not tag_handling
+        )[0]
+        detected_source_language = entry["detected_source_language"]
         
         response = {
             "success": True,
             "original_text": text,
-            "translated_text": result.text,
-            "detected_source_language": result.detected_source_lang,
+            "translated_text": entry["translated_text"],
+            "detected_source_language": detected_source_language,
             "target_language": target_language.upper(),
             "formality_used": formality or "default",
-            "character_count": len(text)
+            "character_count": len(text),
+            "from_cache": entry["from_cache"]
         }
         
+        if "fuzzy_match" in entry:
+            response["fuzzy_match"] = entry["fuzzy_match"]
+        
+        if "placeholders_protected" in entry:
+            response["placeholders_protected"] = entry["placeholders_protected"]
+        
         # Add to history
         server._add_to_history("translate_text", {
-            "source_lang": result.detected_source_lang,
+            "source_lang": detected_source_language,
             "target_lang": target_language.upper(),
             "character_count": len(text),
             "formality": formality
@@ -156,7 +1835,7 @@ def get_source_languages() -> Dict[str, Any]:
         - source_languages: A list of dictionaries, each containing the following keys:
     """
     try:
-        languages = server.translator.get_source_languages()
+        languages = server.call_deepl("get_source_languages")
         
         language_list = []
         for lang in languages:
@@ -192,7 +1871,7 @@ def get_target_languages() -> Dict[str, Any]:
         - target_languages: A list of dictionaries, each containing the following keys:
     """
     try:
-        languages = server.translator.get_target_languages()
+        languages = server.call_deepl("get_target_languages")
         
         language_list = []
         for lang in languages:
@@ -239,7 +1918,7 @@ def get_usage() -> Dict[str, Any]:
             cached_usage["from_cache"] = True
             return cached_usage
         
-        usage = server.translator.get_usage()
+        usage = server.call_deepl("get_usage")
         
         response = {
             "success": True,
@@ -283,6 +1962,8 @@ def get_usage() -> Dict[str, Any]:
         }
 
 @mcp.tool()
+@traced
+@scheduled(PRIORITY_INTERACTIVE)
 def rephrase_text(
     text: str,
     target_language: str,
@@ -309,7 +1990,7 @@ def rephrase_text(
                 "target_lang": original_lang,
                 "formality": formality
             }
-            result = server.translator.translate_text(text, **options)
+            result = server.call_deepl("translate_text", text, **options)
             
             response = {
                 "success": True,
@@ -324,12 +2005,15 @@ def rephrase_text(
             # Strategy 2: Bridge translation (translate to English and back)
             if original_lang != "EN":
                 # First translate to English
-                to_english = server.translator.translate_text(text, target_lang=TARGET_LANGUAGE)
+                with server.tracer.span("rephrase.bridge_leg", leg="to_bridge", bridge_language="EN"):
+                    to_english = server.call_deepl("translate_text", text, target_lang=TARGET_LANGUAGE)
                 # Then translate back to original language
-                back_to_original = server.translator.translate_text(
-                    to_english.text, 
-                    target_lang=original_lang
-                )
+                with server.tracer.span("rephrase.bridge_leg", leg="from_bridge", bridge_language="EN"):
+                    back_to_original = server.call_deepl(
+                        "translate_text",
+                        to_english.text, 
+                        target_lang=original_lang
+                    )
                 
                 response = {
                     "success": True,
@@ -344,11 +2028,14 @@ def rephrase_text(
             else:
                 # For English, try translating to another language and back
                 bridge_lang = "DE"  # Use German as bridge
-                to_bridge = server.translator.translate_text(text, target_lang=bridge_lang)
-                back_to_english = server.translator.translate_text(
-                    to_bridge.text, 
-                    target_lang=TARGET_LANGUAGE
-                )
+                with server.tracer.span("rephrase.bridge_leg", leg="to_bridge", bridge_language=bridge_lang):
+                    to_bridge = server.call_deepl("translate_text", text, target_lang=bridge_lang)
+                with server.tracer.span("rephrase.bridge_leg", leg="from_bridge", bridge_language=bridge_lang):
+                    back_to_english = server.call_deepl(
+                        "translate_text",
+                        to_bridge.text, 
+                        target_lang=TARGET_LANGUAGE
+                    )
                 
                 response = {
                     "success": True,
@@ -380,12 +2067,17 @@ def rephrase_text(
         }
 
 @mcp.tool()
+@traced
+@scheduled(PRIORITY_BULK)
 def batch_translate(
     texts: List[str],
     target_language: str,
     source_language: Optional[str] = None,
     formality: Optional[str] = None,
-    preserve_formatting: bool = False
+    preserve_formatting: bool = False,
+    reuse_fuzzy_matches: bool = False,
+    protect_placeholders: Optional[bool] = None,
+    use_translation_store: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Translate multiple texts in a single request
@@ -396,6 +2088,9 @@ def batch_translate(
         source_language: Source language code (optional)
         formality: Formality level
         preserve_formatting: Whether to preserve formatting
+        reuse_fuzzy_matches: Reuse stored translations of segments that differ only in numbers or inline tags
+        protect_placeholders: Mask numbers, format placeholders, URLs and inline tags during translation (server default if not provided)
+        use_translation_store: Answer from and save to the translation store (server default if not provided)
     """
     try:
         if not texts:
@@ -416,20 +2111,35 @@ def batch_translate(
         if formality and formality != "default":
             options["formality"] = formality
         
-        # Translate all texts
-        results = server.translator.translate_text(texts, **options)
+        if protect_placeholders is None:
+            protect_placeholders = server.protect_placeholders
+        
+        if use_translation_store is None:
+            use_translation_store = server.use_translation_store
+        
+        # Answer known segments from the translation store, translate the rest in one request
+        results = _translate_segments(
+            texts,
+            options,
+            use_store=use_translation_store and not preserve_formatting,
+            reuse_fuzzy_matches=reuse_fuzzy_matches,
+            protect_placeholders=protect_placeholders
+        )
         
         translations = []
         total_chars = 0
         
-        for i, (original, result) in enumerate(zip(texts, results)):
+        for i, (original, entry) in enumerate(zip(texts, results)):
             translation = {
                 "index": i,
                 "original_text": original,
-                "translated_text": result.text,
-                "detected_source_language": result.detected_source_lang,
-                "character_count": len(original)
+                "translated_text": entry["translated_text"],
+                "detected_source_language": entry["detected_source_language"],
+                "character_count": len(original),
+                "from_cache": entry["from_cache"]
             }
+            if "fuzzy_match" in entry:
+                translation["fuzzy_match"] = entry["fuzzy_match"]
             translations.append(translation)
             total_chars += len(original)
         
@@ -438,6 +2148,7 @@ def batch_translate(
             "translations": translations,
             "total_texts": len(texts),
             "total_characters": total_chars,
+            "cached_texts": sum(1 for t in translations if t["from_cache"]),
             "target_language": target_language.upper(),
             "formality_used": formality or "default",
             "processed_at": datetime.now().isoformat()
@@ -462,12 +2173,15 @@ def batch_translate(
         }
 
 @mcp.tool()
+@traced
+@scheduled(PRIORITY_BULK)
 def translate_document(
     file_path: str,
     target_language: str,
     output_path: Optional[str] = None,
     formality: Optional[str] = None,
-    preserve_formatting: bool = True
+    preserve_formatting: bool = True,
+    use_translation_store: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Translate a document file using DeepL API
@@ -478,46 +2192,91 @@ def translate_document(
         output_path: Output path for translated document (optional)
         formality: Formality level
         preserve_formatting: Whether to preserve document formatting
+        use_translation_store: Reuse and remember translations of identical document content (server default if not provided)
     """
     try:
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"File not found: {file_path}"
-            }
+        # Check format and size locally before anything is uploaded
+        file_size = validate_document(file_path)
         
-        # Check file size (DeepL has limits)
-        file_size = os.path.getsize(file_path)
-        if file_size > 20 * 1024 * 1024:  # 20MB limit
-            return {
-                "success": False,
-                "error": "File size exceeds 20MB limit"
-            }
+        # Generate output path if not provided
+        if not output_path:
+            base, ext = os.path.splitext(file_path)
+            output_path = f"{base}_translated_{target_language.lower()}{ext}"
         
         # Prepare options
         options = {"target_lang": target_language.upper()}
         if formality and formality != "default":
             options["formality"] = formality
         
-        # Upload and translate document
-        with open(file_path, "rb") as file:
-            document_handle = server.translator.translate_document_upload(file, **options)
+        if use_translation_store is None:
+            use_translation_store = server.use_translation_store
         
-        # Wait for translation to complete
-        status = server.translator.translate_document_get_status(document_handle)
-        while status.status == "translating":
-            asyncio.sleep(1)
-            status = server.translator.translate_document_get_status(document_handle)
-        
-        if status.status == "done":
-            # Generate output path if not provided
-            if not output_path:
-                base, ext = os.path.splitext(file_path)
-                output_path = f"{base}_translated_{target_language.lower()}{ext}"
+        with open(file_path, "rb") as document:
+            # requests builds the multipart upload in memory; the size limits bound it
+            content_hash = hashlib.file_digest(document, "sha256").hexdigest()
+            
+            # Reuse an earlier translation of identical content instead of uploading it again
+            previous_output = (
+                server.translation_store.get_document(content_hash, target_language, formality)
+                if use_translation_store else None
+            )
+            if previous_output:
+                if os.path.abspath(previous_output) != os.path.abspath(output_path):
+                    def copy_previous(output_file):
+                        with open(previous_output, "rb") as previous_file:
+                            shutil.copyfileobj(previous_file, output_file, DOCUMENT_CHUNK_SIZE)
+                    write_file_atomic(output_path, copy_previous)
+                
+                server._add_to_history("translate_document", {
+                    "target_lang": target_language.upper(),
+                    "file_size": file_size,
+                    "formality": formality,
+                    "status": "done",
+                    "from_cache": True
+                })
+                
+                return {
+                    "success": True,
+                    "input_file": file_path,
+                    "output_file": output_path,
+                    "target_language": target_language.upper(),
+                    "formality_used": formality or "default",
+                    "file_size_bytes": file_size,
+                    "content_hash": content_hash,
+                    "status": "done",
+                    "from_cache": True,
+                    "processed_at": datetime.now().isoformat()
+                }
             
-            # Download translated document
-            with open(output_path, "wb") as output_file:
-                server.translator.translate_document_download(document_handle, output_file)
+            # Upload and translate document
+            with server.tracer.span("deepl.translate_document_upload", kind=SPAN_KIND_CLIENT, file_size=file_size):
+                translator = server.get_translator()
+                document.seek(0)
+                document_handle = translator.translate_document_upload(document, **options)
+        
+        # Wait for translation to complete
+        with server.tracer.span("document.poll") as span:
+            status = translator.translate_document_get_status(document_handle)
+            polls = 1
+            while status.ok and not status.done:
+                time.sleep(DOCUMENT_POLL_INTERVAL)
+                status = translator.translate_document_get_status(document_handle)
+                polls += 1
+            server.tracer.annotate(span, polls=polls)
+        
+        status_name = getattr(status.status, "value", status.status)
+        
+        if status.done:
+            # Stream the translated document into place
+            with server.tracer.span("deepl.translate_document_download", kind=SPAN_KIND_CLIENT):
+                write_file_atomic(
+                    output_path,
+                    lambda output_file: translator.translate_document_download(
+                        document_handle, output_file, chunk_size=DOCUMENT_CHUNK_SIZE
+                    )
+                )
+            if use_translation_store:
+                server.translation_store.put_document(content_hash, target_language, formality, output_path)
             
             response = {
                 "success": True,
@@ -526,7 +2285,9 @@ def translate_document(
                 "target_language": target_language.upper(),
                 "formality_used": formality or "default",
                 "file_size_bytes": file_size,
-                "status": status.status,
+                "content_hash": content_hash,
+                "status": status_name,
+                "from_cache": False,
                 "processed_at": datetime.now().isoformat()
             }
             
@@ -539,14 +2300,14 @@ def translate_document(
                 "target_lang": target_language.upper(),
                 "file_size": file_size,
                 "formality": formality,
-                "status": status.status
+                "status": status_name
             })
             
             return response
         else:
             return {
                 "success": False,
-                "error": f"Document translation failed with status: {status.status}",
+                "error": f"Document translation failed with status: {status_name}",
                 "input_file": file_path
             }
             
@@ -559,6 +2320,8 @@ def translate_document(
         }
 
 @mcp.tool()
+@traced
+@scheduled(PRIORITY_INTERACTIVE)
 def detect_language(text: str) -> Dict[str, Any]:
     """
     Detect the language of given text using DeepL
@@ -568,7 +2331,7 @@ def detect_language(text: str) -> Dict[str, Any]:
     """
     try:
         # Use a dummy translation to get detected language
-        result = server.translator.translate_text(text[:1000], target_lang=TARGET_LANGUAGE)  # Limit text for detection
+        result = server.call_deepl("translate_text", text[:1000], target_lang=TARGET_LANGUAGE)  # Limit text for detection
         
         response = {
             "success": True,
@@ -608,7 +2371,7 @@ def get_glossary_languages() -> Dict[str, Any]:
         - glossary_language_pairs: A list of dictionaries, each containing the following keys:
     """
     try:
-        glossary_languages = server.translator.get_glossary_languages()
+        glossary_languages = server.call_deepl("get_glossary_languages")
         
         language_pairs = []
         for pair in glossary_languages:
@@ -632,6 +2395,7 @@ def get_glossary_languages() -> Dict[str, Any]:
         }
 
 @mcp.tool()
+@traced
 def get_translation_history() -> Dict[str, Any]:
     """
     Get recent translation operation history
@@ -657,6 +2421,7 @@ def get_translation_history() -> Dict[str, Any]:
         }
 
 @mcp.tool()
+@traced
 def analyze_usage_patterns() -> Dict[str, Any]:
     """
     Analyze translation usage patterns from history.
@@ -728,6 +2493,219 @@ def analyze_usage_patterns() -> Dict[str, Any]:
             "error": str(e)
         }
 
+@mcp.tool()
+@traced
+def import_translation_memory(
+    file_path: str,
+    format: Optional[str] = None,
+    source_language: Optional[str] = None,
+    target_language: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Bulk-load a translation memory into the translation store so known segments
+    are answered locally by translate_text and batch_translate
+    
+    Args:
+        file_path: Path to a TMX, XLIFF or PO file, or a request journal
+        format: File format ('tmx', 'xliff', 'po', 'journal'), detected from the extension if not provided
+        source_language: Source language code (optional, overrides the language declared in the file)
+        target_language: Target language code (optional, overrides the file's target language or filters TMX variants)
+    """
+    try:
+        format = format or detect_tm_format(file_path)
+        if format not in TM_PARSERS:
+            return {
+                "success": False,
+                "error": f"Unsupported translation memory format for {file_path}; use one of {', '.join(TM_FORMATS)}",
+                "file_path": file_path
+            }
+        
+        segments = TM_PARSERS[format](file_path, source_language, target_language)
+        started = time.perf_counter()
+        segments_read = 0
+        segments_imported = 0
+        batch = []
+        
+        # Stream segments into the store in fixed-size batches
+        for segment in segments:
+            segments_read += 1
+            batch.append(segment)
+            if len(batch) >= TM_IMPORT_BATCH_SIZE:
+                segments_imported += server.translation_store.put_many(batch, origin=format)
+                batch = []
+        if batch:
+            segments_imported += server.translation_store.put_many(batch, origin=format)
+        
+        elapsed = time.perf_counter() - started
+        
+        server._add_to_history("import_translation_memory", {
+            "format": format,
+            "segments_imported": segments_imported
+        })
+        
+        return {
+            "success": True,
+            "file_path": file_path,
+            "format": format,
+            "segments_read": segments_read,
+            "segments_imported": segments_imported,
+            "duplicates_skipped": segments_read - segments_imported,
+            "elapsed_seconds": round(elapsed, 3),
+            "segments_per_second": round(segments_read / elapsed, 1) if elapsed else segments_read,
+            "imported_at": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Translation memory import error: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "file_path": file_path
+        }
+
+@mcp.tool()
+@traced
+def fuzzy_lookup(
+    text: str,
+    target_language: str,
+    source_language: Optional[str] = None,
+    formality: Optional[str] = None,
+    threshold: float = DEFAULT_FUZZY_THRESHOLD,
+    limit: int = 3
+) -> Dict[str, Any]:
+    """
+    Find previous translations of similar segments in the translation store
+    
+    Args:
+        text: Text to find similar segments for
+        target_language: Target language code
+        source_language: Source language code (optional)
+        formality: Formality level
+        threshold: Minimum character n-gram similarity between 0 and 1
+        limit: Maximum number of suggestions
+    """
+    try:
+        matches = server.translation_store.fuzzy_lookup(
+            text, target_language, formality, source_language, threshold, limit
+        )
+        for match in matches:
+            match["adapted_translation"] = adapt_fuzzy_match(
+                text, match["source_text"], match["translated_text"]
+            )
+        
+        return {
+            "success": True,
+            "text": text,
+            "target_language": target_language.upper(),
+            "matches": matches,
+            "total_matches": len(matches),
+            "searched_at": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Fuzzy lookup error: {e}")
+        return {
+            "success": False,
+            "error": str(e),
+            "text": text
+        }
+
+@mcp.tool()
+@traced
+def get_server_stats() -> Dict[str, Any]:
+    """
+    Get translation store, scheduler, request deduplication, tracing and profiling statistics of the running server.
+    Args:
+        None
+    Returns:
+        A dictionary with the following keys:
+        - success: True if the statistics were retrieved successfully, False otherwise
+        - error: The error message if the statistics were not retrieved successfully
+        - translation_store: Entry count and hit rate of the translation store
+        - scheduler: Active and queued requests, rejections and queue times per priority class
+        - single_flight: DeepL requests executed and identical concurrent calls that shared them
+        - tracing: Whether tracing is enabled, its output file and the number of exported traces
+        - profiling: Whether the sampling profiler is running, its settings and sample count
+    """
+    try:
+        return {
+            "success": True,
+            "translation_store": server.translation_store.stats(),
+            "scheduler": server.scheduler.stats(),
+            "single_flight": server.single_flight.stats(),
+            "tracing": server.tracer.stats(),
+            "profiling": server.profiler.status(),
+            "retrieved_at": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error getting server stats: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp.tool()
+@traced
+def configure_tracing(enabled: bool, output_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Switch per-request tracing on or off at runtime. Each tool call is exported as
+    one OpenTelemetry (OTLP/JSON) trace per line, with spans for queueing, cache
+    lookups, DeepL calls, rephrase bridge legs and document polling.
+    
+    Args:
+        enabled: Whether to record traces
+        output_path: File the traces are appended to, in the directory of DEEPL_TRACE_PATH (optional, keeps the current path if not provided)
+    """
+    try:
+        server.tracer.configure(enabled, output_path)
+        logger.info(f"Tracing {'enabled' if enabled else 'disabled'}: {server.tracer.output_path}")
+        return {
+            "success": True,
+            "tracing": server.tracer.stats(),
+            "configured_at": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error configuring tracing: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp.tool()
+@traced
+def configure_profiling(
+    enabled: bool,
+    sampling_rate: int = DEFAULT_PROFILE_SAMPLING_RATE,
+    output_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Start or stop the sampling profiler at runtime. Stopping writes the sampled
+    stacks of all threads in collapsed format, ready for flame graph tools.
+    
+    Args:
+        enabled: Whether the profiler should be running
+        sampling_rate: Samples per second (default: 100)
+        output_path: File the collapsed stacks are written to on stop, in the directory of DEEPL_PROFILE_PATH (optional)
+    """
+    try:
+        if enabled:
+            server.profiler.start(sampling_rate, output_path)
+            profiling = server.profiler.status()
+        else:
+            profiling = server.profiler.stop()
+        logger.info(f"Sampling profiler {'started' if enabled else 'stopped'}: {server.profiler.output_path}")
+        return {
+            "success": True,
+            "profiling": profiling,
+            "configured_at": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error configuring profiling: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 @mcp.resource("usage://deepl")
 def usage_resource():
     return get_usage()
@@ -752,6 +2730,10 @@ def translation_history_resource():
 def usage_patterns_resource():
     return analyze_usage_patterns()
 
+@mcp.resource("stats://server")
+def server_stats_resource():
+    return get_server_stats()
+
 @mcp.prompt("summarize")
 def summarize_prompt(text: str) -> str:
     """Prompt to summarize a given text."""
@@ -763,9 +2745,36 @@ if __name__ == "__main__":
     parser.add_argument("--host", help="Host to bind to", default="0.0.0.0")
     parser.add_argument("--port", type=int, help="Port to bind to", default=int(os.environ.get("PORT", 8000)))
 
+    subparsers = parser.add_subparsers(dest="command")
+    import_parser = subparsers.add_parser(
+        "import-tm",
+        help="Bulk-load TMX/XLIFF/PO translation memories or request journals into the translation store"
+    )
+    import_parser.add_argument("files", nargs="+", help="Translation memory files to import")
+    import_parser.add_argument("--format", choices=TM_FORMATS, help="File format (detected from the extension by default)")
+    import_parser.add_argument("--source-language", help="Source language code")
+    import_parser.add_argument("--target-language", help="Target language code")
+
     args = parser.parse_args()
 
+    if args.command == "import-tm":
+        if server.translation_store.path == ":memory:":
+            logger.warning("DEEPL_TRANSLATION_STORE is not set; imported segments will not be persisted")
+        failed = False
+        for file_path in args.files:
+            result = import_translation_memory(
+                file_path,
+                format=args.format,
+                source_language=args.source_language,
+                target_language=args.target_language
+            )
+            print(json.dumps(result, indent=2))
+            failed = failed or not result["success"]
+        sys.exit(1 if failed else 0)
+
     try:
+        # Fail at startup rather than on the first tool call if DeepL cannot be reached
+        server.get_translator()
         if args.transport == "stdio":
             mcp.run(transport="stdio")
             logger.info("DeepL FastMCP server running with STDIO transport.")
@@ -779,5 +2788,4 @@ if __name__ == "__main__":
             parser.error("Invalid transport specified.")
     except Exception as e:
         logger.error(f"Failed to start FastMCP server: {e}")
-        import sys
         sys.exit(1)
\ No newline at end of file
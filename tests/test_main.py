@@ -1,9 +1,18 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import anyio.to_thread
 import pytest
+from fastmcp import Client
 from unittest.mock import patch, MagicMock
 import main
 
 @pytest.fixture(autouse=True)
 def patch_deepl_translator():
+    main.server.translation_store.clear()
     with patch.object(main.server, 'translator') as mock_translator:
         yield mock_translator
 
@@ -13,10 +22,10 @@ def test_translate_text_basic(patch_deepl_translator):
     mock_result.detected_source_lang = 'EN'
     patch_deepl_translator.translate_text.return_value = mock_result
 
-    response = main.translate_text(
+    response = asyncio.run(main.translate_text(
         text='Hello world',
         target_language='DE'
-    )
+    ))
     assert response['success'] is True
     assert response['translated_text'] == 'Hallo Welt'
     assert response['detected_source_language'] == 'EN'
@@ -45,3 +54,611 @@ def test_get_target_languages(patch_deepl_translator):
     assert response['success'] is True
     assert response['target_languages'][0]['code'] == 'DE'
     assert response['target_languages'][0]['name'] == 'German'
+
+
+def test_journal_record_and_replay(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl.gz')
+    live = MagicMock()
+    live.translate_text.return_value = [
+        main.deepl.TextResult(text='Hallo', detected_source_lang='EN', billed_characters=5),
+        main.deepl.TextResult(text='Welt', detected_source_lang='EN', billed_characters=5),
+    ]
+
+    recorder = main.JournalingTranslator(live, 'record', journal_path)
+    recorder.translate_text(['Hello', 'World'], target_lang='DE')
+    recorder.close()
+
+    replayer = main.JournalingTranslator(None, 'replay', journal_path)
+    result = replayer.translate_text('World', target_lang='DE')
+    assert result.text == 'Welt'
+    assert result.detected_source_lang == 'EN'
+
+    with pytest.raises(main.deepl.DeepLException):
+        replayer.translate_text('World', target_lang='FR')
+
+
+def test_journal_replays_usage_and_language_reads(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl.gz')
+    live = MagicMock()
+    live.get_usage.return_value = main.deepl.Usage({'character_count': 42, 'character_limit': 500000})
+    live.get_target_languages.return_value = [main.deepl.Language('DE', 'German', supports_formality=True)]
+    live.get_glossary_languages.return_value = [main.GlossaryLanguagePair('EN', 'DE')]
+
+    recorder = main.JournalingTranslator(live, 'record', journal_path)
+    recorder.get_usage()
+    recorder.get_target_languages()
+    recorder.get_glossary_languages()
+    recorder.close()
+
+    replayer = main.JournalingTranslator(None, 'replay', journal_path)
+    usage = replayer.get_usage()
+    assert (usage.character.count, usage.character.limit, usage.document.count) == (42, 500000, None)
+    languages = replayer.get_target_languages()
+    assert (languages[0].code, languages[0].name, languages[0].supports_formality) == ('DE', 'German', True)
+    pair = replayer.get_glossary_languages()[0]
+    assert (pair.source_lang, pair.target_lang) == ('EN', 'DE')
+
+    with pytest.raises(main.deepl.DeepLException):
+        replayer.get_source_languages()
+
+
+def test_translate_text_served_from_store(patch_deepl_translator):
+    mock_result = MagicMock()
+    mock_result.text = 'Hallo Welt'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = mock_result
+
+    first = asyncio.run(main.translate_text(text='Hello world', target_language='DE'))
+    second = asyncio.run(main.translate_text(text='Hello world', target_language='de'))
+    assert first['from_cache'] is False
+    assert second['from_cache'] is True
+    assert second['translated_text'] == 'Hallo Welt'
+    assert patch_deepl_translator.translate_text.call_count == 1
+
+
+def test_batch_translate_only_sends_unknown_texts(patch_deepl_translator):
+    main.server.translation_store.put('Hello', 'Hallo', 'DE', source_lang='EN')
+    mock_result = MagicMock()
+    mock_result.text = 'Welt'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = [mock_result]
+
+    response = asyncio.run(main.batch_translate(texts=['Hello', 'World', 'World'], target_language='DE'))
+    assert response['success'] is True
+    assert [t['translated_text'] for t in response['translations']] == ['Hallo', 'Welt', 'Welt']
+    assert response['cached_texts'] == 1
+    patch_deepl_translator.translate_text.assert_called_once()
+    assert patch_deepl_translator.translate_text.call_args.args[0] == ['World']
+
+
+def test_translate_text_can_bypass_store(patch_deepl_translator):
+    mock_result = MagicMock()
+    mock_result.text = 'Hallo Welt'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = mock_result
+
+    asyncio.run(main.translate_text(text='Hello world', target_language='DE', use_translation_store=False))
+    response = asyncio.run(main.translate_text(text='Hello world', target_language='DE', use_translation_store=False))
+    assert response['from_cache'] is False
+    assert patch_deepl_translator.translate_text.call_count == 2
+    assert main.server.translation_store.get('Hello world', 'DE') is None
+
+
+def test_translation_store_evicts_oldest_segments():
+    store = main.TranslationStore(max_entries=2)
+    store.put('One', 'Eins', 'DE')
+    store.put('Two', 'Zwei', 'DE')
+    store.put('One', 'Eins!', 'DE')
+    store.put_many([('Three', 'Drei', None, 'DE', None)], origin='tmx')
+
+    assert store.get('Two', 'DE') is None
+    assert store.get('One', 'DE')['translated_text'] == 'Eins!'
+    assert store.get('Three', 'DE')['translated_text'] == 'Drei'
+    assert store.stats()['entries'] == 2
+    assert store.stats()['evicted'] == 1
+
+
+def test_import_translation_memory_tmx(tmp_path, patch_deepl_translator):
+    tmx_path = tmp_path / 'memory.tmx'
+    tmx_path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<tmx version="1.4"><header srclang="en-US"/><body>'
+        '<tu><tuv xml:lang="en-US"><seg>Save</seg></tuv><tuv xml:lang="de-DE"><seg>Speichern</seg></tuv></tu>'
+        '<tu><tuv xml:lang="en-US"><seg>Save</seg></tuv><tuv xml:lang="de-DE"><seg>Speichern</seg></tuv></tu>'
+        '<tu><tuv xml:lang="en-US"><seg>Open</seg></tuv><tuv xml:lang="de-DE"><seg>\u00d6ffnen</seg></tuv></tu>'
+        '</body></tmx>',
+        encoding='utf-8'
+    )
+
+    response = main.import_translation_memory(str(tmx_path))
+    assert response['success'] is True
+    assert response['format'] == 'tmx'
+    assert response['segments_read'] == 3
+    assert response['segments_imported'] == 2
+    assert response['duplicates_skipped'] == 1
+
+    translation = asyncio.run(main.translate_text(text='Open', target_language='DE'))
+    assert translation['translated_text'] == '\u00d6ffnen'
+    assert translation['detected_source_language'] == 'EN'
+    patch_deepl_translator.translate_text.assert_not_called()
+
+
+def test_import_translation_memory_po(tmp_path):
+    po_path = tmp_path / 'messages.po'
+    po_path.write_text(
+        'msgid ""\n'
+        'msgstr ""\n'
+        '"Language: fr\\n"\n'
+        '\n'
+        'msgid "Cancel"\n'
+        'msgstr "Annuler"\n'
+        '\n'
+        '#, fuzzy\n'
+        'msgid "Close"\n'
+        'msgstr "Fermer"\n'
+        '\n'
+        'msgid ""\n'
+        '"Multi "\n'
+        '"line"\n'
+        'msgstr "Plusieurs lignes"\n',
+        encoding='utf-8'
+    )
+
+    response = main.import_translation_memory(str(po_path), source_language='EN')
+    assert response['success'] is True
+    assert response['segments_imported'] == 2
+    assert main.server.translation_store.get('Multi line', 'FR')['translated_text'] == 'Plusieurs lignes'
+    assert main.server.translation_store.get('Close', 'FR') is None
+
+
+def test_import_translation_memory_xliff2_detaches_units(tmp_path):
+    xliff_path = tmp_path / 'messages.xlf'
+    xliff_path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xliff xmlns="urn:oasis:names:tc:xliff:document:2.0" version="2.0" srcLang="en" trgLang="de">'
+        '<file id="f1">'
+        '<unit id="u1"><notes><note>Toolbar button</note></notes>'
+        '<segment><source>Print</source><target>Drucken</target></segment>'
+        '<segment><source>Print all</source><target>Alle drucken</target></segment></unit>'
+        '<unit id="u2"><segment><source>Quit</source><target>Beenden</target></segment></unit>'
+        '</file></xliff>',
+        encoding='utf-8'
+    )
+
+    response = main.import_translation_memory(str(xliff_path))
+    assert response['segments_imported'] == 3
+    assert main.server.translation_store.get('Print all', 'DE')['translated_text'] == 'Alle drucken'
+
+    file_element = None
+    for event, elem in main._iter_xml_units(str(xliff_path), ('unit', 'segment')):
+        if event == 'start' and main._local_name(elem.tag) == 'file':
+            file_element = elem
+    assert len(file_element) == 0
+
+
+def test_fuzzy_lookup_finds_near_duplicates():
+    main.server.translation_store.put(
+        'You have 3 new messages', 'Sie haben 3 neue Nachrichten', 'DE', source_lang='EN'
+    )
+    main.server.translation_store.put('Delete account', 'Konto löschen', 'DE', source_lang='EN')
+
+    response = main.fuzzy_lookup(text='You have 17 new messages!', target_language='DE', threshold=0.7)
+    assert response['success'] is True
+    assert response['matches'][0]['source_text'] == 'You have 3 new messages'
+    assert response['matches'][0]['adapted_translation'] is None
+
+
+def test_fuzzy_index_picks_up_imported_batches_incrementally():
+    store = main.TranslationStore()
+    store.put_many([('Open the selected file', 'Ausgewählte Datei öffnen', 'EN', 'DE', None)], origin='tmx')
+    assert store.fuzzy_lookup('Open the selected file!', 'DE')[0]['source_text'] == 'Open the selected file'
+    index = store._fuzzy_indexes[('DE', 'default')]['index']
+
+    store.put_many([('Close the selected file', 'Ausgewählte Datei schließen', 'EN', 'DE', None)], origin='tmx')
+    store.put('Save the selected file', 'Ausgewählte Datei speichern', 'DE', source_lang='EN')
+    assert store.fuzzy_lookup('Close the selected file!', 'DE')[0]['source_text'] == 'Close the selected file'
+    assert store._fuzzy_indexes[('DE', 'default')]['index'] is index
+    assert len(index) == 3
+
+
+def test_translate_text_reuses_fuzzy_match_with_substituted_numbers(patch_deepl_translator):
+    main.server.translation_store.put(
+        'You have 3 new <b>messages</b>', 'Sie haben 3 neue <b>Nachrichten</b>', 'DE', source_lang='EN'
+    )
+
+    response = asyncio.run(main.translate_text(
+        text='You have 17 new <b>messages</b>', target_language='DE', reuse_fuzzy_matches=True
+    ))
+    assert response['translated_text'] == 'Sie haben 17 neue <b>Nachrichten</b>'
+    assert response['from_cache'] is True
+    assert response['fuzzy_match']['source_text'] == 'You have 3 new <b>messages</b>'
+    patch_deepl_translator.translate_text.assert_not_called()
+
+
+def test_adapt_fuzzy_match_rejects_unsafe_substitution():
+    assert main.adapt_fuzzy_match('1 file', '2 files', '2 Dateien') is None
+    assert main.adapt_fuzzy_match('Page 4 of 9', 'Page 1 of 2', 'Seite 1 von 2') == 'Seite 4 von 9'
+    assert main.adapt_fuzzy_match('Total: 1.5', 'Total: 2.5', 'Summe: 2,5') is None
+    assert main.adapt_fuzzy_match('Delete 1 files', 'Delete 2 files', 'Zwei Dateien löschen') is None
+
+
+def test_translate_text_does_not_reuse_spelled_out_number(patch_deepl_translator):
+    main.server.translation_store.put('You have 3 days left', 'Sie haben noch drei Tage', 'DE', source_lang='EN')
+    mock_result = MagicMock()
+    mock_result.text = 'Sie haben noch 30 Tage'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = mock_result
+
+    response = asyncio.run(main.translate_text(
+        text='You have 30 days left', target_language='DE', reuse_fuzzy_matches=True
+    ))
+    assert response['translated_text'] == 'Sie haben noch 30 Tage'
+    assert response['from_cache'] is False
+    patch_deepl_translator.translate_text.assert_called_once()
+
+
+def test_mask_and_restore_placeholders():
+    masked, placeholders = main.mask_placeholders('Hi {name}, you have 3 <b>new</b> messages at https://example.com & more.')
+    assert masked == 'Hi <x id="0"/>, you have <x id="1"/> <x id="2"/>new<x id="3"/> messages at <x id="4"/> &amp; more.'
+    assert placeholders == ['{name}', '3', '<b>', '</b>', 'https://example.com']
+
+    translated = 'Hallo <x id="0"/>, Sie haben <x id="1"/> <x id="2"/>neue<x id="3"/> Nachrichten unter <x id="4"/> &amp; mehr.'
+    assert main.restore_placeholders(translated, placeholders) == (
+        'Hallo {name}, Sie haben 3 <b>neue</b> Nachrichten unter https://example.com & mehr.'
+    )
+    assert main.restore_placeholders('Hallo <x id="0"/>', placeholders) is None
+
+
+def test_restore_placeholders_rejects_misordered_tags():
+    assert main.restore_placeholders('Klicken Sie jetzt <x id="1"/>Speichern<x id="0"/>', ['<b>', '</b>']) is None
+    placeholders = ['<a href="/save">', '<b>', '</b>', '</a>', '<br/>']
+    assert main.restore_placeholders('<x id="0"/><x id="1"/>a<x id="3"/>b<x id="2"/><x id="4"/>', placeholders) is None
+    assert main.restore_placeholders('<x id="4"/><x id="0"/><x id="1"/>a<x id="2"/><x id="3"/>', placeholders) == (
+        '<br/><a href="/save"><b>a</b></a>'
+    )
+    # Independent spans may swap places
+    assert main.restore_placeholders('<x id="2"/>b<x id="3"/> <x id="0"/>a<x id="1"/>', ['<b>', '</b>', '<i>', '</i>']) == (
+        '<i>b</i> <b>a</b>'
+    )
+
+
+def test_translate_text_falls_back_when_tags_come_back_out_of_order(patch_deepl_translator):
+    masked_result = MagicMock()
+    masked_result.text = 'Klicken Sie jetzt <x id="1"/>Speichern<x id="0"/>'
+    masked_result.detected_source_lang = 'EN'
+    raw_result = MagicMock()
+    raw_result.text = 'Klicken Sie jetzt auf <b>Speichern</b>'
+    raw_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.side_effect = [masked_result, raw_result]
+
+    response = asyncio.run(main.translate_text(text='Click <b>Save</b> now', target_language='DE', protect_placeholders=True))
+    assert response['translated_text'] == 'Klicken Sie jetzt auf <b>Speichern</b>'
+    assert main.server.translation_store.get('Click <x id="0"/>Save<x id="1"/> now', 'DE') is None
+
+
+def test_batch_translate_protect_placeholders_collapses_templates(patch_deepl_translator):
+    mock_result = MagicMock()
+    mock_result.text = 'Sie haben <x id="0"/> neue Nachrichten'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = [mock_result]
+
+    response = asyncio.run(main.batch_translate(
+        texts=['You have 3 new messages', 'You have 17 new messages'],
+        target_language='DE',
+        protect_placeholders=True
+    ))
+    assert [t['translated_text'] for t in response['translations']] == [
+        'Sie haben 3 neue Nachrichten',
+        'Sie haben 17 neue Nachrichten'
+    ]
+    patch_deepl_translator.translate_text.assert_called_once()
+    args, kwargs = patch_deepl_translator.translate_text.call_args
+    assert args[0] == ['You have <x id="0"/> new messages']
+    assert kwargs['tag_handling'] == 'xml'
+    assert kwargs['ignore_tags'] == 'x'
+
+    cached = asyncio.run(main.translate_text(text='You have 42 new messages', target_language='DE', protect_placeholders=True))
+    assert cached['translated_text'] == 'Sie haben 42 neue Nachrichten'
+    assert cached['from_cache'] is True
+
+
+def test_batch_translate_unescapes_unmasked_texts_sent_as_xml(patch_deepl_translator):
+    masked_result = MagicMock()
+    masked_result.text = 'Sie haben <x id="0"/> Nachrichten'
+    masked_result.detected_source_lang = 'EN'
+    plain_result = MagicMock()
+    plain_result.text = 'Tom &amp; Jerry'
+    plain_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = [masked_result, plain_result]
+
+    response = asyncio.run(main.batch_translate(
+        texts=['You have 3 messages', 'Tom and Jerry'],
+        target_language='DE',
+        protect_placeholders=True
+    ))
+    assert patch_deepl_translator.translate_text.call_args.kwargs['tag_handling'] == 'xml'
+    assert [t['translated_text'] for t in response['translations']] == ['Sie haben 3 Nachrichten', 'Tom & Jerry']
+    assert main.server.translation_store.get('Tom and Jerry', 'DE')['translated_text'] == 'Tom & Jerry'
+
+
+def test_translate_text_falls_back_when_placeholder_is_lost(patch_deepl_translator):
+    masked_result = MagicMock()
+    masked_result.text = 'Sie haben neue Nachrichten'
+    masked_result.detected_source_lang = 'EN'
+    raw_result = MagicMock()
+    raw_result.text = 'Sie haben 3 neue Nachrichten'
+    raw_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.side_effect = [masked_result, raw_result]
+
+    response = asyncio.run(main.translate_text(text='You have 3 new messages', target_language='DE', protect_placeholders=True))
+    assert response['translated_text'] == 'Sie haben 3 neue Nachrichten'
+    assert 'tag_handling' not in patch_deepl_translator.translate_text.call_args.kwargs
+    assert main.server.translation_store.get('You have <x id="0"/> new messages', 'DE') is None
+
+
+def test_scheduler_rejects_when_queue_is_full():
+    scheduler = main.RequestScheduler(max_concurrent=1, max_queue_depth=0)
+    asyncio.run(scheduler.acquire('a'))
+    with pytest.raises(main.QueueFullError):
+        asyncio.run(scheduler.acquire('b'))
+    assert scheduler.stats()['classes']['interactive']['rejected'] == 1
+
+
+def test_scheduler_keeps_a_slot_for_interactive_requests():
+    scheduler = main.RequestScheduler(max_concurrent=2, queue_timeout=0.05)
+    asyncio.run(scheduler.acquire('bulk-client', main.PRIORITY_BULK))
+    with pytest.raises(main.QueueFullError):
+        asyncio.run(scheduler.acquire('other-bulk-client', main.PRIORITY_BULK))
+    assert asyncio.run(scheduler.acquire('interactive-client', main.PRIORITY_INTERACTIVE)) == 0.0
+    assert scheduler.stats()['classes']['bulk']['queued'] == 0
+
+
+def test_scheduler_round_robins_across_clients():
+    scheduler = main.RequestScheduler(max_concurrent=1)
+    order = []
+
+    async def request(client_id, label):
+        await scheduler.acquire(client_id)
+        order.append(label)
+        scheduler.release()
+
+    async def scenario():
+        await scheduler.acquire('holder')
+        tasks = []
+        for client_id, label in [('a', 'a1'), ('a', 'a2'), ('b', 'b1')]:
+            tasks.append(asyncio.create_task(request(client_id, label)))
+            while scheduler.stats()['queued'] < len(tasks):
+                await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ['a1', 'b1', 'a2']
+
+
+def test_interactive_call_is_not_stuck_behind_queued_bulk_calls(monkeypatch):
+    monkeypatch.setattr(main.server, 'scheduler', main.RequestScheduler(max_concurrent=2, max_queue_depth=10))
+
+    def slow_translate(text, **options):
+        time.sleep(0.1)
+        result = MagicMock(text='Hallo', detected_source_lang='EN')
+        return [result] * len(text) if isinstance(text, list) else result
+
+    async def scenario():
+        # Fewer worker threads than queued calls, as with anyio's default of 40 under load
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 3
+        clients = [Client(main.mcp) for _ in range(4)]
+        for client in clients:
+            await client.__aenter__()
+        try:
+            bulk = [
+                asyncio.create_task(client.call_tool('batch_translate', {
+                    'texts': [f'Bulk text {n} from client {i}'], 'target_language': 'DE'
+                }))
+                for n in range(4) for i, client in enumerate(clients)
+            ]
+            deadline = time.monotonic() + 5
+            while main.server.scheduler.stats()['queued'] < 10 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            started = time.monotonic()
+            interactive = await clients[0].call_tool('translate_text', {'text': 'Hello', 'target_language': 'DE'})
+            elapsed = time.monotonic() - started
+            bulk_results = await asyncio.gather(*bulk)
+            return interactive, elapsed, bulk_results
+        finally:
+            for client in clients:
+                await client.__aexit__(None, None, None)
+
+    with patch.object(main.server, 'translator') as translator:
+        translator.translate_text.side_effect = slow_translate
+        interactive, elapsed, bulk_results = asyncio.run(scenario())
+
+    assert interactive.data['success'] is True
+    assert elapsed < 0.6
+    rejected = [r for r in bulk_results if not r.data['success']]
+    assert len(rejected) == 16 - 10 - 1
+    assert 'Server busy' in rejected[0].data['error']
+    stats = main.server.scheduler.stats()['classes']
+    assert stats['bulk']['rejected'] == len(rejected)
+    assert stats['bulk']['queue_time_ms']['max'] > 100
+
+
+def test_translate_document_skips_identical_content(tmp_path, patch_deepl_translator):
+    input_path = tmp_path / 'report.docx'
+    input_path.write_bytes(b'PK\x03\x04' + b'content')
+    uploaded = []
+
+    def upload(document, **options):
+        uploaded.append((os.path.basename(document.name), document.read()))
+        return 'handle'
+
+    status = MagicMock(ok=True, done=True, status='done', billed_characters=7)
+    patch_deepl_translator.translate_document_upload.side_effect = upload
+    patch_deepl_translator.translate_document_get_status.return_value = status
+    patch_deepl_translator.translate_document_download.side_effect = (
+        lambda handle, output_file, chunk_size: output_file.write(b'translated')
+    )
+
+    first = asyncio.run(main.translate_document(file_path=str(input_path), target_language='DE'))
+    assert first['success'] is True
+    assert first['from_cache'] is False
+    assert uploaded == [('report.docx', b'PK\x03\x04content')]
+    assert (tmp_path / 'report_translated_de.docx').read_bytes() == b'translated'
+    assert (tmp_path / 'report_translated_de.docx').stat().st_mode & 0o777 == 0o666 & ~main.UMASK
+
+    copy_path = tmp_path / 'copy.docx'
+    copy_path.write_bytes(b'PK\x03\x04' + b'content')
+    second = asyncio.run(main.translate_document(file_path=str(copy_path), target_language='DE'))
+    assert second['from_cache'] is True
+    assert second['content_hash'] == first['content_hash']
+    assert (tmp_path / 'copy_translated_de.docx').read_bytes() == b'translated'
+    assert len(uploaded) == 1
+
+
+def test_translate_document_does_not_reuse_overwritten_output(tmp_path, patch_deepl_translator):
+    first_input = tmp_path / 'a.docx'
+    first_input.write_bytes(b'PK\x03\x04' + b'first')
+    second_input = tmp_path / 'b.docx'
+    second_input.write_bytes(b'PK\x03\x04' + b'second')
+    output_path = tmp_path / 'out.docx'
+    output_path.write_bytes(b'old')
+    output_path.chmod(0o644)
+
+    def upload(document, **options):
+        return document.read()
+
+    status = MagicMock(ok=True, done=True, status='done', billed_characters=7)
+    patch_deepl_translator.translate_document_upload.side_effect = upload
+    patch_deepl_translator.translate_document_get_status.return_value = status
+    patch_deepl_translator.translate_document_download.side_effect = (
+        lambda handle, output_file, chunk_size: output_file.write(b'translated ' + handle[4:])
+    )
+
+    asyncio.run(main.translate_document(file_path=str(first_input), target_language='DE', output_path=str(output_path)))
+    asyncio.run(main.translate_document(file_path=str(second_input), target_language='DE', output_path=str(output_path)))
+    assert output_path.stat().st_mode & 0o777 == 0o644
+
+    again = asyncio.run(main.translate_document(
+        file_path=str(first_input), target_language='DE', output_path=str(tmp_path / 'a2.docx')
+    ))
+    assert again['from_cache'] is False
+    assert (tmp_path / 'a2.docx').read_bytes() == b'translated first'
+    assert patch_deepl_translator.translate_document_upload.call_count == 3
+
+
+def test_translate_document_validates_before_upload(tmp_path, patch_deepl_translator):
+    fake_pdf = tmp_path / 'scan.pdf'
+    fake_pdf.write_bytes(b'not a pdf')
+    unsupported = tmp_path / 'image.bmp'
+    unsupported.write_bytes(b'BM')
+
+    assert 'does not match' in asyncio.run(main.translate_document(file_path=str(fake_pdf), target_language='DE'))['error']
+    assert 'Unsupported' in asyncio.run(main.translate_document(file_path=str(unsupported), target_language='DE'))['error']
+    assert 'not found' in asyncio.run(main.translate_document(file_path=str(tmp_path / 'missing.txt'), target_language='DE'))['error']
+    patch_deepl_translator.translate_document_upload.assert_not_called()
+
+
+def test_concurrent_identical_calls_share_one_deepl_request(patch_deepl_translator):
+    main.server.single_flight = main.SingleFlight()
+    release = threading.Event()
+    mock_lang = MagicMock()
+    mock_lang.code = 'DE'
+    mock_lang.name = 'German'
+
+    def slow_get_target_languages():
+        release.wait(timeout=5)
+        return [mock_lang]
+
+    patch_deepl_translator.get_target_languages.side_effect = slow_get_target_languages
+    responses = []
+    threads = [
+        threading.Thread(target=lambda: responses.append(main.get_target_languages()))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while main.server.single_flight.stats()['shared'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert patch_deepl_translator.get_target_languages.call_count == 1
+    assert [r['target_languages'][0]['code'] for r in responses] == ['DE'] * 5
+    stats = main.server.single_flight.stats()
+    assert stats['by_call']['get_target_languages'] == {'executed': 1, 'shared': 4}
+    assert stats['in_flight'] == 0
+
+
+def test_tracing_exports_tool_call_as_otlp_trace(tmp_path, monkeypatch, patch_deepl_translator):
+    trace_path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(main.server, 'tracer', main.Tracer(output_path=str(tmp_path / 'default.jsonl')))
+    mock_result = MagicMock()
+    mock_result.text = 'Hallo Welt'
+    mock_result.detected_source_lang = 'EN'
+    patch_deepl_translator.translate_text.return_value = mock_result
+
+    assert main.configure_tracing(enabled=True, output_path=str(trace_path))['success'] is True
+    asyncio.run(main.translate_text(text='Hello world', target_language='DE'))
+    main.configure_tracing(enabled=False)
+
+    traces = [
+        json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans']
+        for line in trace_path.read_text(encoding='utf-8').splitlines()
+    ]
+    spans = next(t for t in traces if any(s['name'] == 'tools/call translate_text' for s in t))
+    by_name = {span['name']: span for span in spans}
+    root = by_name['tools/call translate_text']
+    assert root['parentSpanId'] == ''
+    assert {span['traceId'] for span in spans} == {root['traceId']}
+    for name in ('scheduler.queue', 'translation_store.lookup', 'deepl.translate_text'):
+        assert by_name[name]['parentSpanId'] == root['spanId']
+    assert by_name['deepl.translate_text']['kind'] == main.SPAN_KIND_CLIENT
+    assert {'key': 'single_flight.shared', 'value': {'boolValue': False}} in by_name['deepl.translate_text']['attributes']
+    assert int(root['endTimeUnixNano']) >= int(root['startTimeUnixNano'])
+
+
+def test_configure_profiling_writes_collapsed_stacks(tmp_path, monkeypatch):
+    profile_path = tmp_path / 'profile.folded'
+    monkeypatch.setattr(main.server, 'profiler', main.SamplingProfiler(str(tmp_path / 'default.folded')))
+
+    started = main.configure_profiling(enabled=True, sampling_rate=500, output_path=str(profile_path))
+    assert started['profiling']['running'] is True
+    time.sleep(0.1)
+    stopped = main.configure_profiling(enabled=False)
+
+    assert stopped['profiling']['running'] is False
+    assert stopped['profiling']['samples'] > 0
+    stack, count = profile_path.read_text(encoding='utf-8').splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert ';' in stack
+
+
+def test_runtime_output_paths_stay_in_configured_directory(tmp_path, monkeypatch):
+    victim = tmp_path / 'victim.txt'
+    victim.write_text('keep me', encoding='utf-8')
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    monkeypatch.setattr(main.server, 'tracer', main.Tracer(output_path=str(output_dir / 'traces.jsonl')))
+    monkeypatch.setattr(main.server, 'profiler', main.SamplingProfiler(str(output_dir / 'profile.folded')))
+
+    for path in (str(victim), '../victim.txt'):
+        assert main.configure_profiling(enabled=True, output_path=path)['success'] is False
+        assert main.configure_tracing(enabled=True, output_path=path)['success'] is False
+    assert main.server.profiler.running is False
+    assert victim.read_text(encoding='utf-8') == 'keep me'
+
+    configured = main.configure_tracing(enabled=False, output_path='other.jsonl')
+    assert configured['tracing']['output_path'] == os.path.realpath(output_dir / 'other.jsonl')
+
+    threads = [
+        threading.Thread(target=main.configure_profiling, kwargs={'enabled': True, 'output_path': 'run.folded'})
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    main.configure_profiling(enabled=False)
+    assert not [t for t in threading.enumerate() if t.name == 'deepl-sampling-profiler']
+    assert (output_dir / 'run.folded').exists()